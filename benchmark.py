@@ -0,0 +1,474 @@
+#!/bin/env python3
+
+# 合成ソースフォントを使ったビルドパイプラインのベンチマーク
+# fontTools の FontBuilder で英文・日本語・アイコンのソースフォントを指定のグリフ数で生成し、
+# fontforge_script.py と fonttools_script.py を実行して処理段階ごとの時間を計測する
+
+import configparser
+import glob
+import json
+import math
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from fontTools.agl import UV2AGL
+from fontTools.fontBuilder import FontBuilder
+from fontTools.pens.ttGlyphPen import TTGlyphPen
+
+# iniファイルを読み込む
+settings = configparser.ConfigParser()
+settings.read("build.ini", encoding="utf-8")
+
+JP_FONT = settings.get("DEFAULT", "JP_FONT")
+ENG_FONT = settings.get("DEFAULT", "ENG_FONT")
+SOURCE_FONTS_DIR = settings.get("DEFAULT", "SOURCE_FONTS_DIR")
+BUILD_FONTS_DIR = settings.get("DEFAULT", "BUILD_FONTS_DIR")
+NERD_FONT = "SymbolsNerdFont-Regular.ttf"
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = "benchmark_baseline.json"
+DEFAULT_GLYPH_COUNTS = [1000, 10000, 25000]
+# ベンチマークするスタイル (出力スタイル, 日本語フォントのスタイル, 英文フォントのスタイル)
+STYLE = ("Regular", "Regular", "Medium")
+# 計測誤差による誤検知を避けるため、これ未満の増加は劣化とみなさない (秒)
+MIN_REGRESSION_SECONDS = 0.5
+
+# 合成する英文フォントの収録範囲
+ENG_RANGES = [
+    (0x0020, 0x007E),  # Basic Latin
+    (0x00A0, 0x024F),  # Latin-1 Supplement..Latin Extended-B
+    (0x0370, 0x03FF),  # Greek and Coptic
+    (0x0400, 0x045F),  # Cyrillic
+    (0x2010, 0x205E),  # General Punctuation
+    (0x2190, 0x21FF),  # Arrows
+    (0x2200, 0x22FF),  # Mathematical Operators
+    (0x2500, 0x25FF),  # Box Drawing..Geometric Shapes
+]
+# 処理中に名前で参照される英文フォントのグリフ
+ENG_EXTRA_GLYPHS = ["zero.zero", "r.serif"]
+# 合成する日本語フォントの収録範囲 (漢字はグリフ数に合わせて追加する)
+JP_RANGES = [
+    (0x0020, 0x007E),  # Basic Latin
+    (0x00A0, 0x00FF),  # Latin-1 Supplement
+    (0x2010, 0x203B),  # General Punctuation
+    (0x2190, 0x21D4),  # Arrows
+    (0x2200, 0x223D),  # Mathematical Operators
+    (0x2460, 0x2473),  # Enclosed Alphanumerics
+    (0x25A0, 0x25EF),  # Geometric Shapes
+    (0x2600, 0x2642),  # Miscellaneous Symbols
+    (0x3000, 0x30FF),  # CJK Symbols and Punctuation..Katakana
+    (0xFF01, 0xFF5E),  # Halfwidth and Fullwidth Forms
+]
+# 処理中に参照される漢字
+JP_REQUIRED_KANJI = [0x4E00, 0x4E8C, 0x529B, 0x53E3, 0x5DE5]
+JP_KANJI_START = 0x4E00
+# CJK 互換漢字 (同じグリフへの別コードポイント。FontForge では Alternate Unicode になる)
+JP_ALIAS_START = 0xF900
+# 漢字の異体字セレクタ
+JP_VARIATION_SELECTOR = 0xE0100
+# アイコンフォントの収録範囲 (Powerline Symbols を含む私用領域)
+ICON_START = 0xE000
+
+if sys.platform == "win32":
+    DEFAULT_FONTFORGE_COMMAND = [
+        "C:\\Program Files (x86)\\FontForgeBuilds\\bin\\ffpython.exe"
+    ]
+else:
+    DEFAULT_FONTFORGE_COMMAND = ["fontforge", "-lang=py", "-script"]
+
+options = {}
+
+
+def main():
+    # オプション判定
+    get_options()
+    if options.get("unknown-option"):
+        usage()
+        sys.exit(1)
+
+    baseline_path = options.get("baseline", DEFAULT_BASELINE)
+    baseline = {}
+    if not options.get("save-baseline") and os.path.exists(baseline_path):
+        baseline = load_baseline(baseline_path)
+
+    results = {}
+    for glyph_count in options.get("glyphs", DEFAULT_GLYPH_COUNTS):
+        print(f"=== Benchmark {glyph_count} glyphs ===")
+        results[str(glyph_count)] = run_benchmark(glyph_count)
+
+    if options.get("save-baseline"):
+        save_results(baseline_path, results)
+        print_results(results, {})
+        print(f"Saved baseline to {baseline_path}")
+        return
+
+    regressions = print_results(results, baseline)
+    if options.get("output"):
+        save_results(options["output"], results)
+    if regressions and options.get("threshold") is not None:
+        print(f"Error: {len(regressions)} stages regressed")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+
+def usage():
+    print(
+        f"Usage: {sys.argv[0]} "
+        "[--glyphs=1000,10000,25000] [--fontforge=COMMAND] "
+        '[--fontforge-options="--nerd-font"] [--repeat=N] '
+        "[--save-baseline] [--baseline=PATH] [--threshold=PERCENT] [--output=PATH]"
+    )
+
+
+def get_options():
+    """オプションを取得する"""
+
+    global options
+
+    for arg in sys.argv[1:]:
+        # オプション判定
+        if arg.startswith("--glyphs="):
+            # 日本語フォントのグリフ数をカンマ区切りで指定する
+            options["glyphs"] = [int(n) for n in arg.split("=")[1].split(",")]
+        elif arg.startswith("--fontforge="):
+            options["fontforge"] = arg.split("=", 1)[1]
+        elif arg.startswith("--fontforge-options="):
+            # ベンチマークするバリアントの fontforge_script.py のオプション
+            options["fontforge-options"] = arg.split("=", 1)[1]
+        elif arg.startswith("--repeat="):
+            # 同じ条件で繰り返し、段階ごとに最も速い結果を採用する
+            options["repeat"] = int(arg.split("=")[1])
+        elif arg == "--save-baseline":
+            options["save-baseline"] = True
+        elif arg.startswith("--baseline="):
+            options["baseline"] = arg.split("=", 1)[1]
+        elif arg.startswith("--threshold="):
+            # ベースラインからの増加率 (%) がこれを超えた段階があれば失敗とする
+            options["threshold"] = float(arg.split("=")[1])
+        elif arg.startswith("--output="):
+            options["output"] = arg.split("=", 1)[1]
+        else:
+            options["unknown-option"] = True
+            return
+
+
+def run_benchmark(glyph_count: int):
+    """指定のグリフ数の合成フォントでビルドし、段階ごとの計測結果を返す"""
+    stages = {}
+    with tempfile.TemporaryDirectory(prefix="bizin-gothic-benchmark-") as work_dir:
+        create_source_fonts(work_dir, glyph_count)
+        for _ in range(options.get("repeat", 1)):
+            shutil.rmtree(f"{work_dir}/{BUILD_FONTS_DIR}", ignore_errors=True)
+            for name, stage in run_build(work_dir).items():
+                # 繰り返した中で最も速い結果を採用する
+                if name not in stages or stage["wall_time"] < stages[name]["wall_time"]:
+                    stages[name] = stage
+    return stages
+
+
+def run_build(work_dir: str):
+    """作業ディレクトリでビルドを実行し、ビルドレポートの段階ごとの計測結果を返す"""
+    merged_style = STYLE[0]
+    fontforge_options = shlex.split(options.get("fontforge-options", "--nerd-font"))
+    commands = [
+        get_fontforge_command()
+        + [
+            f"{SCRIPT_DIR}/fontforge_script.py",
+            *fontforge_options,
+            f"--styles={merged_style}",
+            "--jobs=1",
+            "--no-cache",
+        ],
+        [
+            sys.executable,
+            f"{SCRIPT_DIR}/fonttools_script.py",
+            "--jobs=1",
+            "--no-cache",
+        ],
+    ]
+    for command in commands:
+        subprocess.run(command, cwd=work_dir, check=True)
+
+    stages = {}
+    for report_path in glob.glob(f"{work_dir}/{BUILD_FONTS_DIR}/reports/*.json"):
+        with open(report_path, encoding="utf-8") as f:
+            report = json.load(f)
+        for section in ["fontforge", "fonttools"]:
+            for stage in report.get(section, {}).get("stages", []):
+                stages[f"{section}.{stage['name']}"] = {
+                    "wall_time": stage["wall_time"],
+                    "cpu_time": stage["cpu_time"],
+                    "peak_rss_mb": stage["peak_rss_mb"],
+                }
+    return stages
+
+
+def get_fontforge_command():
+    """FontForge の Python スクリプト実行コマンドを取得する"""
+    if "fontforge" not in options:
+        return DEFAULT_FONTFORGE_COMMAND
+    if sys.platform == "win32":
+        # Windows ではパスの区切り文字を壊さないよう非POSIXモードで分割し、引用符を外す
+        return [
+            token.strip('"') for token in shlex.split(options["fontforge"], posix=False)
+        ]
+    return shlex.split(options["fontforge"])
+
+
+def create_source_fonts(work_dir: str, glyph_count: int):
+    """作業ディレクトリに source_fonts と同じ構成の合成ソースフォントを作成する
+    カスタムグリフの sfd などは実際のファイルをそのまま使う"""
+    source_dir = f"{work_dir}/{SOURCE_FONTS_DIR}"
+    shutil.copytree(
+        SOURCE_FONTS_DIR,
+        source_dir,
+        ignore=shutil.ignore_patterns("*.ttf", "*.otf", ".index"),
+    )
+    shutil.copyfile("build.ini", f"{work_dir}/build.ini")
+
+    _, jp_style, eng_style = STYLE
+    create_eng_font(
+        f"{source_dir}/{ENG_FONT.replace('{style}', eng_style)}", eng_style, glyph_count
+    )
+    create_jp_font(
+        f"{source_dir}/{JP_FONT.replace('{style}', jp_style)}", jp_style, glyph_count
+    )
+    create_icon_font(f"{source_dir}/{NERD_FONT}", glyph_count)
+
+
+def create_eng_font(path: str, style: str, glyph_count: int):
+    """英文フォントを作成する
+    収録範囲のグリフに加え、日本語フォントの 1/10 程度まで収録範囲外のグリフを加える"""
+    codepoints = [cp for start, end in ENG_RANGES for cp in range(start, end + 1)]
+    cmap = {cp: UV2AGL.get(cp, f"uni{cp:04X}") for cp in codepoints}
+    glyph_names = list(cmap.values()) + ENG_EXTRA_GLYPHS
+    # 収録範囲外のグリフ (字形のバリエーションなど) で数を合わせる
+    for i in range(glyph_count // 10 - len(glyph_names)):
+        glyph_names.append(f"alt{i:05d}")
+    build_font(
+        path,
+        "Synthetic Latin",
+        style,
+        units_per_em=1000,
+        ascent=859,
+        descent=190,
+        glyph_names=glyph_names,
+        advance=500,
+        contours=2,
+        cmap=cmap,
+    )
+
+
+def create_jp_font(path: str, style: str, glyph_count: int):
+    """日本語フォントを作成する
+    収録範囲の記号・かなに漢字を加えて、グリフ数を glyph_count に合わせる。
+    実際のフォントと同様に、CJK 互換漢字のような同じグリフへの別コードポイントと異体字シーケンスを含める"""
+    codepoints = [cp for start, end in JP_RANGES for cp in range(start, end + 1)]
+    cmap = {cp: f"uni{cp:04X}" for cp in codepoints + JP_REQUIRED_KANJI}
+    kanji = list(JP_REQUIRED_KANJI)
+    cp = JP_KANJI_START
+    while len(cmap) < glyph_count:
+        if cp not in cmap:
+            cmap[cp] = f"uni{cp:04X}"
+            kanji.append(cp)
+        cp += 1
+
+    # 漢字の一部を別コードポイントからも参照させる
+    alias_count = min(len(kanji) // 50, 0xFAFF - JP_ALIAS_START)
+    for i in range(alias_count):
+        cmap[JP_ALIAS_START + i] = cmap[kanji[i * 50]]
+    # 漢字の一部に異体字シーケンスを設定する (既定の字形と別グリフの字形)
+    glyph_names = sorted(set(cmap.values()))
+    uvs = []
+    for i, cp in enumerate(kanji[: len(kanji) // 50]):
+        if i % 2 == 0:
+            uvs.append((cp, JP_VARIATION_SELECTOR, None))
+        else:
+            variant_name = f"uni{cp:04X}.var"
+            glyph_names.append(variant_name)
+            uvs.append((cp, JP_VARIATION_SELECTOR, variant_name))
+
+    build_font(
+        path,
+        "Synthetic CJK",
+        style,
+        units_per_em=1000,
+        ascent=880,
+        descent=120,
+        glyph_names=glyph_names,
+        advance=1000,
+        contours=6,
+        cmap=cmap,
+        uvs=uvs,
+    )
+
+
+def create_icon_font(path: str, glyph_count: int):
+    """アイコンフォントを作成する (グリフ数は日本語フォントの 1/4 程度)"""
+    cmap = {}
+    for i in range(max(glyph_count // 4, 0xE0D4 - ICON_START + 1)):
+        cp = ICON_START + i
+        # 私用領域を超える分は補助私用領域に割り当てる
+        if cp > 0xF8FF:
+            cp = 0xF0000 + cp - 0xF900
+        cmap[cp] = f"icon{cp:05X}"
+    build_font(
+        path,
+        "Synthetic Icons",
+        "Regular",
+        units_per_em=2048,
+        ascent=1638,
+        descent=410,
+        glyph_names=list(cmap.values()),
+        advance=1200,
+        contours=3,
+        cmap=cmap,
+    )
+
+
+def build_font(
+    path,
+    family_name,
+    style_name,
+    units_per_em,
+    ascent,
+    descent,
+    glyph_names,
+    advance,
+    contours,
+    cmap,
+    uvs=None,
+):
+    """FontBuilder で TrueType フォントを作成する"""
+    glyph_order = [".notdef"] + glyph_names
+    glyphs = {}
+    metrics = {}
+    for i, name in enumerate(glyph_order):
+        glyphs[name], lsb = draw_glyph(i, advance, ascent, contours)
+        metrics[name] = (advance, lsb)
+
+    fb = FontBuilder(units_per_em, isTTF=True)
+    fb.setupGlyphOrder(glyph_order)
+    fb.setupCharacterMap(cmap, uvs=uvs)
+    fb.setupGlyf(glyphs)
+    fb.setupHorizontalMetrics(metrics)
+    fb.setupHorizontalHeader(ascent=ascent, descent=-descent)
+    fb.setupNameTable({"familyName": family_name, "styleName": style_name})
+    fb.setupOS2(
+        sTypoAscender=ascent,
+        sTypoDescender=-descent,
+        usWinAscent=ascent,
+        usWinDescent=descent,
+    )
+    fb.setupPost()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fb.save(path)
+
+
+def draw_glyph(index: int, advance: int, height: int, contours: int):
+    """2次ベジェ曲線の輪郭を持つグリフを描画し、(グリフ, 左サイドベアリング) を返す
+    グリフごとに形を少しずつ変え、実際のフォントと同程度の点数にする"""
+    pen = TTGlyphPen(None)
+    margin = advance // 10
+    columns = math.ceil(math.sqrt(contours))
+    rows = math.ceil(contours / columns)
+    cell_width = (advance - margin * 2) / columns
+    cell_height = height * 0.8 / rows
+    radius = min(cell_width, cell_height) * 0.4
+    x_min = advance
+    for c in range(contours):
+        cx = margin + cell_width * (c % columns + 0.5)
+        cy = cell_height * (c // columns + 0.5)
+        # 12 個の2次ベジェ曲線で閉じた輪郭を作る
+        segments = 12
+        points = []
+        for s in range(segments * 2):
+            angle = math.pi * s / segments
+            r = radius * (1 + 0.1 * math.sin(index + s)) if s % 2 else radius
+            points.append(
+                (round(cx + r * math.cos(angle)), round(cy + r * math.sin(angle)))
+            )
+        x_min = min(x_min, min(x for x, _ in points))
+        pen.moveTo(points[0])
+        for s in range(1, len(points), 2):
+            pen.qCurveTo(points[s], points[(s + 1) % len(points)])
+        pen.closePath()
+    return pen.glyph(), x_min
+
+
+def load_baseline(path: str) -> dict:
+    """ベースラインの計測結果を返す
+    fontforge_script.py のオプションが異なるベースラインとは比較できないため、
+    --threshold の指定があればエラーとし、無ければ警告して比較しない"""
+    with open(path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    baseline_options = baseline.get("fontforge-options", "--nerd-font")
+    current_options = options.get("fontforge-options", "--nerd-font")
+    if sorted(shlex.split(baseline_options)) == sorted(shlex.split(current_options)):
+        return baseline["results"]
+    message = (
+        f"baseline {path} was measured with --fontforge-options={baseline_options!r},"
+        f" not {current_options!r}"
+    )
+    if options.get("threshold") is not None:
+        print(f"Error: {message}")
+        sys.exit(1)
+    print(f"Warning: {message}; results are not compared")
+    return {}
+
+
+def save_results(path: str, results: dict):
+    """計測結果を保存する"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "fontforge-options": options.get("fontforge-options", "--nerd-font"),
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+
+
+def print_results(results: dict, baseline: dict):
+    """計測結果をベースラインと比較して表示し、劣化した段階のリストを返す"""
+    threshold = options.get("threshold")
+    regressions = []
+    print("=== Results ===")
+    print(
+        f"{'glyphs':>7} {'stage':<48} {'wall':>8} {'cpu':>8} {'rss(MB)':>8} "
+        f"{'baseline':>9} {'diff':>7}"
+    )
+    for glyph_count, stages in results.items():
+        for name, stage in stages.items():
+            line = (
+                f"{glyph_count:>7} {name:<48} {stage['wall_time']:>7.2f}s "
+                f"{stage['cpu_time']:>7.2f}s {stage['peak_rss_mb'] or 0:>8.1f}"
+            )
+            base_stage = baseline.get(glyph_count, {}).get(name)
+            if base_stage is not None:
+                base_time = base_stage["wall_time"]
+                diff = stage["wall_time"] - base_time
+                ratio = diff / base_time * 100 if base_time > 0 else 0.0
+                line += f" {base_time:>8.2f}s {ratio:>+6.1f}%"
+                if (
+                    threshold is not None
+                    and ratio > threshold
+                    and diff > MIN_REGRESSION_SECONDS
+                ):
+                    line += "  REGRESSION"
+                    regressions.append(
+                        f"{glyph_count} glyphs {name}: "
+                        f"{base_time:.2f}s -> {stage['wall_time']:.2f}s ({ratio:+.1f}%)"
+                    )
+            print(line)
+    return regressions
+
+
+if __name__ == "__main__":
+    main()
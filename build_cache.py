@@ -0,0 +1,100 @@
+#!/bin/env python3
+
+# ビルド中間ファイルのキャッシュ
+# fontforge_script.py (FontForge 組み込みの Python) からも使うため、標準ライブラリのみに依存する
+
+import configparser
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import uuid
+
+# iniファイルを読み込む
+settings = configparser.ConfigParser()
+settings.read("build.ini", encoding="utf-8")
+
+CACHE_DIR = settings.get("DEFAULT", "CACHE_DIR")
+
+# (パス, サイズ, 更新日時) ごとのハッシュ値
+file_hashes = {}
+
+
+def file_hash(path: str) -> str:
+    """ファイル内容のハッシュ値を返す"""
+    stat = os.stat(path)
+    stat_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if stat_key not in file_hashes:
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha256.update(chunk)
+        file_hashes[stat_key] = sha256.hexdigest()
+    return file_hashes[stat_key]
+
+
+def source_hash(func) -> str:
+    """関数のソースコードのハッシュ値を返す
+    処理内容を変えたときに、その関数の結果のキャッシュだけを作り直すために使う"""
+    return hashlib.sha256(inspect.getsource(func).encode("utf-8")).hexdigest()
+
+
+def settings_values() -> dict:
+    """キャッシュキーに含める build.ini の値を返す"""
+    return dict(settings["DEFAULT"])
+
+
+def bytes_hash(data: bytes) -> str:
+    """バイト列のハッシュ値を返す"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_key(*parts) -> str:
+    """JSON に変換できる値の組からキャッシュキーを作る"""
+    data = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def get(namespace: str, key: str, name: str):
+    """キャッシュ済みファイルのパスを返す。キャッシュが無い場合は None を返す"""
+    path = entry_path(namespace, key, name)
+    if os.path.exists(path):
+        return path
+    return None
+
+
+def put(namespace: str, key: str, name: str, src_path: str, move=False) -> str:
+    """ファイルをキャッシュに格納し、格納先のパスを返す"""
+    path = entry_path(namespace, key, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # 並列ビルドで同じキーに書き込んでも壊れたファイルを読まないよう、一時ファイルから置き換える
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    if move:
+        shutil.move(src_path, tmp_path)
+    else:
+        shutil.copyfile(src_path, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def put_bytes(namespace: str, key: str, name: str, data: bytes) -> str:
+    """バイト列をキャッシュに格納し、格納先のパスを返す"""
+    path = entry_path(namespace, key, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return path
+
+
+def entry_path(namespace: str, key: str, name: str) -> str:
+    """キャッシュの格納先パスを返す"""
+    return f"{CACHE_DIR}/{namespace}/{key}/{name}"
+
+
+def clear():
+    """キャッシュをすべて削除する"""
+    if os.path.exists(CACHE_DIR):
+        shutil.rmtree(CACHE_DIR)
@@ -0,0 +1,155 @@
+#!/bin/env python3
+
+# ビルドの処理段階ごとの実行時間・メモリ使用量の記録
+# fontforge_script.py (FontForge 組み込みの Python) からも使うため、標準ライブラリのみに依存する
+
+import configparser
+import cProfile
+import json
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+
+# iniファイルを読み込む
+settings = configparser.ConfigParser()
+settings.read("build.ini", encoding="utf-8")
+
+BUILD_FONTS_DIR = settings.get("DEFAULT", "BUILD_FONTS_DIR")
+REPORTS_DIR = f"{BUILD_FONTS_DIR}/reports"
+
+
+class BuildReport:
+    """1つの (バリアント, スタイル) のビルドレポート
+    fontforge_script.py と fonttools_script.py がそれぞれのセクションを同じ JSON ファイルに書き込む"""
+
+    def __init__(self, section: str, name: str, profile=False):
+        self.section = section
+        self.name = name
+        self.profile = profile
+        self.stages = []
+        # 処理段階以外にセクションに記録する値
+        self.values = {}
+
+    @contextmanager
+    def stage(self, stage_name: str):
+        """with 文で囲んだ処理の実行時間とピークメモリ使用量を記録する"""
+        reset_peak_rss()
+        profiler = cProfile.Profile() if self.profile else None
+        start_wall_time = time.perf_counter()
+        start_cpu_time = time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            self.stages.append(
+                {
+                    "name": stage_name,
+                    "wall_time": round(time.perf_counter() - start_wall_time, 3),
+                    "cpu_time": round(time.process_time() - start_cpu_time, 3),
+                    "peak_rss_mb": get_peak_rss_mb(),
+                }
+            )
+            if profiler is not None:
+                os.makedirs(f"{REPORTS_DIR}/profile", exist_ok=True)
+                profiler.dump_stats(
+                    f"{REPORTS_DIR}/profile/{self.name}.{self.section}.{stage_name}.prof"
+                )
+
+    def record(self, key: str, value):
+        """処理段階の記録とあわせて保存する値を設定する"""
+        self.values[key] = value
+
+    def save(self):
+        """レポートを JSON ファイルに保存する。他のセクションの内容は残す"""
+        os.makedirs(REPORTS_DIR, exist_ok=True)
+        report_path = f"{REPORTS_DIR}/{self.name}.json"
+        report = {"name": self.name}
+        if os.path.exists(report_path):
+            with open(report_path, encoding="utf-8") as f:
+                report = json.load(f)
+        report[self.section] = {
+            "stages": self.stages,
+            "wall_time": round(sum(s["wall_time"] for s in self.stages), 3),
+            "cpu_time": round(sum(s["cpu_time"] for s in self.stages), 3),
+            "peak_rss_mb": max((s["peak_rss_mb"] for s in self.stages), default=None),
+            **self.values,
+        }
+        tmp_path = f"{report_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, report_path)
+
+
+def reset_peak_rss():
+    """段階ごとのピークメモリ使用量を測るため、プロセスのピーク値をリセットする
+    リセットできるのは Linux のみで、他の OS ではプロセス開始からのピーク値となる"""
+    if sys.platform.startswith("linux"):
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            pass
+
+
+def get_peak_rss_mb():
+    """プロセスのピークメモリ使用量 (MB) を返す。取得できない場合は None を返す"""
+    if sys.platform.startswith("linux"):
+        try:
+            with open("/proc/self/status", encoding="utf-8") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return round(int(line.split()[1]) / 1024, 1)
+        except OSError:
+            pass
+    if sys.platform == "win32":
+        return get_peak_working_set_mb_windows()
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS はバイト単位、その他は KB 単位
+    if sys.platform == "darwin":
+        return round(max_rss / 1024 / 1024, 1)
+    return round(max_rss / 1024, 1)
+
+
+def get_peak_working_set_mb_windows():
+    """Windows のプロセスのピークワーキングセット (MB) を返す"""
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(PROCESS_MEMORY_COUNTERS)
+    get_current_process = ctypes.windll.kernel32.GetCurrentProcess
+    get_current_process.restype = wintypes.HANDLE
+    get_process_memory_info = ctypes.windll.psapi.GetProcessMemoryInfo
+    get_process_memory_info.argtypes = [
+        wintypes.HANDLE,
+        ctypes.POINTER(PROCESS_MEMORY_COUNTERS),
+        wintypes.DWORD,
+    ]
+    if not get_process_memory_info(
+        get_current_process(), ctypes.byref(counters), counters.cb
+    ):
+        return None
+    return round(counters.PeakWorkingSetSize / 1024 / 1024, 1)
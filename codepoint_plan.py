@@ -0,0 +1,328 @@
+#!/bin/env python3
+
+# 合成後の各符号位置をどのフォントのグリフで表示するかを、ソースフォントの cmap から事前に決める
+# 決めた結果は範囲選択にまとめて FontForge に適用する。
+# fontforge_script.py (FontForge 組み込みの Python) から使うため、標準ライブラリのみに依存する
+
+import configparser
+
+import font_index
+
+# iniファイルを読み込む
+settings = configparser.ConfigParser()
+settings.read("build.ini", encoding="utf-8")
+
+SOURCE_FONTS_DIR = settings.get("DEFAULT", "SOURCE_FONTS_DIR")
+JP_FONT = settings.get("DEFAULT", "JP_FONT")
+ENG_FONT = settings.get("DEFAULT", "ENG_FONT")
+
+# 日本語文書に頻出する記号 (英語フォントから削除して日本語フォントのグリフを使う)
+JPDOC_SYMBOLS = [
+    (0x00A7, 0x00A7),  # §
+    (0x00B1, 0x00B1),  # ±
+    (0x00B6, 0x00B6),  # ¶
+    (0x00F7, 0x00F7),  # ÷
+    (0x00D7, 0x00D7),  # ×
+    (0x21D2, 0x21D2),  # ⇒
+    (0x21D4, 0x21D4),  # ⇔
+    (0x25A0, 0x25A1),  # ■-□
+    (0x25A0, 0x25B3),  # ▲-△
+    (0x25BC, 0x25BD),  # ▼-▽
+    (0x25C6, 0x25C7),  # ◆-◇
+    (0x25CB, 0x25CB),  # ○
+    (0x25CE, 0x25CF),  # ◎-●
+    (0x25E5, 0x25E5),  # ◥
+    (0x25EF, 0x25EF),  # ◯
+    (0x221A, 0x221A),  # √
+    (0x221E, 0x221E),  # ∞
+    (0x2010, 0x2010),  # ‐
+    (0x2018, 0x201A),  # ‘-‚
+    (0x201C, 0x201E),  # “-„
+    (0x2020, 0x2021),  # †-‡
+    (0x2026, 0x2026),  # …
+    (0x2030, 0x2030),  # ‰
+    (0x2190, 0x2193),  # ←-↓
+    (0x2200, 0x2200),  # ∀
+    (0x2202, 0x2203),  # ∂-∃
+    (0x2208, 0x2208),  # ∈
+    (0x220B, 0x220B),  # ∋
+    (0x2211, 0x2211),  # ∑
+    (0x2225, 0x2225),  # ∥
+    (0x2227, 0x222C),  # ∧-∬
+    (0x2260, 0x2261),  # ≠-≡
+    (0x2282, 0x2283),  # ⊂-⊃
+    (0x2286, 0x2287),  # ⊆-⊇
+    (0x2500, 0x257F),  # ─-╿ (Box Drawing)
+]
+
+# East Asian Ambiguous Width のグリフのうち、Nerd Fonts 版で半角幅にするもの
+# ref: Unicode East Asian Ambiguous Width: https://www.unicode.org/Public/15.0.0/ucd/EastAsianWidth.txt
+# 半分に縮小するグリフ
+EAW_SHRINK = [
+    (
+        0x01CD,
+        0x01DB,
+    ),  # LATIN CAPITAL LETTER A WITH CARON..LATIN CAPITAL LETTER U WITH DIAERESIS
+    (
+        0x0386,
+        0x03CF,
+    ),  # GREEK CAPITAL LETTER ALPHA WITH TONOS..GREEK SMALL LETTER OMEGA WITH DASIA
+    (0x0401, 0x044F),  # CYRILLIC CAPITAL LETTER IO..CYRILLIC SMALL LETTER YA
+    (0x0451, 0x045F),  # CYRILLIC SMALL LETTER IO..CYRILLIC SMALL LETTER DZHE
+    (0x2025, 0x2025),  # TWO DOT LEADER
+    (0x203B, 0x203B),  # REFERENCE MARK
+    (0x2103, 0x2103),  # DEGREE CELSIUS
+    (0x2121, 0x2122),  # TELEPHONE SIGN..TRADE MARK SIGN
+    (0x212B, 0x212B),  # ANGSTROM SIGN
+    (0x213A, 0x213B),  # ROTATED CAPITAL Q..FACSIMILE SIGN
+    (0x2160, 0x216B),  # ROMAN NUMERAL ONE..ROMAN NUMERAL TWELVE
+    (0x2170, 0x217B),  # SMALL ROMAN NUMERAL ONE..SMALL ROMAN NUMERAL TWELVE
+    (0x2200, 0x2200),  # FOR ALL
+    (0x2202, 0x2203),  # PARTIAL DIFFERENTIAL..THERE EXISTS
+    (0x2207, 0x2208),  # NABLA..ELEMENT OF
+    (0x220B, 0x220B),  # CONTAINS AS MEMBER
+    (0x221F, 0x2220),  # RIGHT ANGLE..ANGLE
+    (0x2225, 0x222C),  # PARALLEL TO..DOUBLE INTEGRAL
+    (0x222E, 0x222E),  # CONTOUR INTEGRAL
+    (0x2234, 0x2235),  # THEREFORE..BECAUSE
+    (0x2252, 0x2252),  # APPROXIMATELY EQUAL TO OR THE IMAGE OF
+    (0x2261, 0x2261),  # IDENTICAL TO
+    (0x2266, 0x2267),  # LESS-THAN OVER EQUAL TO..GREATER-THAN OVER EQUAL TO
+    (0x226A, 0x226B),  # MUCH LESS-THAN..MUCH GREATER-THAN
+    (0x2282, 0x2283),  # SUBSET OF..SUPERSET OF
+    (0x2286, 0x2287),  # SUBSET OF OR EQUAL TO..SUPERSET OF OR EQUAL TO
+    (0x22A5, 0x22A5),  # UP TACK
+    (0x2460, 0x24FF),  # CIRCLED DIGIT ONE..NEGATIVE CIRCLED DIGIT TEN
+    (0x25A0, 0x25A1),  # BLACK SQUARE..WHITE SQUARE
+    (0x25B2, 0x25B3),  # BLACK UP-POINTING TRIANGLE..WHITE UP-POINTING TRIANGLE
+    (0x25BC, 0x25BD),  # BLACK DOWN-POINTING TRIANGLE..WHITE DOWN-POINTING TRIANGLE
+    (0x25CE, 0x25CE),  # BULLSEYE
+    (0x25EF, 0x25EF),  # LARGE CIRCLE
+    (0x2605, 0x2606),  # BLACK STAR..WHITE STAR
+    (0x260E, 0x260E),  # BLACK TELEPHONE
+    (0x2640, 0x2640),  # FEMALE SIGN
+    (0x2642, 0x2642),  # MALE SIGN
+    (0x2668, 0x266F),  # HOT SPRINGS..MUSIC SHARP SIGN
+    (0x2756, 0x2756),  # BLACK DIAMOND MINUS WHITE X
+    (
+        0x2776,
+        0x277F,
+    ),  # DINGBAT NEGATIVE CIRCLED DIGIT ONE..DINGBAT NEGATIVE CIRCLED NUMBER TEN
+    (0x27A1, 0x27A1),  # BLACK RIGHTWARDS ARROW
+    (0x29BF, 0x29BF),  # CIRCLED BULLET
+    (0x1F100, 0x1F100),  # DIGIT ZERO FULL STOP
+]
+# 半分の幅にしても収まるために幅を半分に位置調整だけするグリフ
+EAW_MOVE = [
+    (0x2016, 0x2016),  # DOUBLE VERTICAL LINE
+]
+# 文字が潰れて見えなくなってしまうため、縮小なし、位置移動なしで幅だけ半角にするグリフ
+EAW_WIDTH_ONLY = [
+    (0x2600, 0x2603),  # BLACK SUN WITH RAYS..SNOWMAN
+    (0x261C, 0x261F),  # WHITE LEFT POINTING INDEX..WHITE DOWN POINTING INDEX
+]
+# 半分の幅にしつつ、潰れないように縦には広げるグリフ
+EAW_SHRINK_TALL = [
+    (0x21D2, 0x21D2),  # RIGHTWARDS DOUBLE ARROW
+    (0x21D4, 0x21D4),  # LEFT RIGHT DOUBLE ARROW
+    (0x221D, 0x221D),  # PROPORTIONAL TO
+    (0x223D, 0x223D),  # REVERSED TILDE
+]
+
+# カスタムグリフで置き換える符号位置
+# 合成前にグリフを削除するため、sfd ファイルにあるその他のグリフは合成されない
+# 英語フォント: チルダ
+ENG_CUSTOM_GLYPHS = [0x007E]
+# 日本語フォント: ぱぴぷぺぽ パピプペポ
+JP_CUSTOM_GLYPHS = [
+    0x3071,
+    0x3074,
+    0x3077,
+    0x307A,
+    0x307D,
+    0x30D1,
+    0x30D4,
+    0x30D7,
+    0x30DA,
+    0x30DD,
+]
+# Discord 版: ぱぴぷぺぽ パピプペポ、ヘベ、カ力 エ工 ロ口 ー一 ニ二
+DISCORD_CUSTOM_GLYPHS = JP_CUSTOM_GLYPHS + [
+    0x30D8,
+    0x30D9,
+    0x529B,
+    0x5DE5,
+    0x53E3,
+    0x30FC,
+    0x4E00,
+    0x4E8C,
+]
+
+
+def read_sfd_codepoints(path: str) -> set:
+    """FontForge の sfd ファイルに含まれるグリフの符号位置を返す"""
+    codepoints = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("Encoding: "):
+                # "Encoding: <エンコーディング位置> <Unicode> <GID>" の形式
+                fields = line.split()
+                if len(fields) == 4 and int(fields[2]) >= 0:
+                    codepoints.add(int(fields[2]))
+            elif line.startswith("AltUni2: "):
+                # "<Unicode>.<異体字セレクタ>.<予約>" を16進数で並べた形式
+                # 異体字セレクタを伴わないものだけが cmap に入る
+                for altuni in line.split()[1:]:
+                    uni, variation_selector, _ = altuni.split(".")
+                    if int(variation_selector, 16) == 0xFFFFFFFF:
+                        codepoints.add(int(uni, 16))
+    return codepoints
+
+
+def expand_ranges(ranges) -> set:
+    """(開始, 終了) の範囲のリストを符号位置の集合に展開する"""
+    return {code for start, end in ranges for code in range(start, end + 1)}
+
+
+def make_plan(
+    jp_codepoints: set,
+    eng_codepoints: set,
+    nerd_codepoints=None,
+    remove_jpdoc_symbols=False,
+) -> dict:
+    """各フォントから削除する符号位置と、合成後の符号位置の所有者を決める
+    優先順位は Nerd Fonts > 英語フォント > 日本語フォントとする。
+    remove_jpdoc_symbols を指定した場合は、日本語文書に頻出する記号を英語フォントから外す"""
+    nerd_codepoints = nerd_codepoints or set()
+    eng_jpdoc = set()
+    if remove_jpdoc_symbols:
+        eng_jpdoc = eng_codepoints & expand_ranges(JPDOC_SYMBOLS)
+    eng_kept = eng_codepoints - eng_jpdoc
+    jp_duplicate = jp_codepoints & eng_kept
+    jp_kept = jp_codepoints - jp_duplicate
+    jp_nerd = jp_kept & nerd_codepoints
+    eng_nerd = eng_kept & nerd_codepoints
+    return {
+        # 各処理段階で削除する符号位置
+        "remove": {
+            "eng_jpdoc": eng_jpdoc,
+            "jp_duplicate": jp_duplicate,
+            "jp_nerd": jp_nerd,
+            "eng_nerd": eng_nerd,
+        },
+        # 合成後に各フォントのグリフで表示する符号位置
+        "owner": {
+            "nerd": set(nerd_codepoints),
+            "eng": eng_kept - nerd_codepoints,
+            "jp": jp_kept - nerd_codepoints,
+        },
+        # 範囲選択の境界に使う、各フォントに存在する符号位置
+        "present": {
+            "jp": jp_codepoints,
+            "eng": eng_codepoints,
+        },
+    }
+
+
+def make_source_plan(jp_style, eng_style, options: dict, jp_font_path=None) -> dict:
+    """ソースフォントとカスタムグリフの符号位置から、指定したオプションでの割り当てを決める
+    jp_font_path を指定した場合は、ソースフォントの代わりにそのフォントを日本語フォントとする"""
+    if jp_font_path is None:
+        jp_font_path = f"{SOURCE_FONTS_DIR}/{JP_FONT.replace('{style}', jp_style)}"
+    jp_codepoints = font_index.codepoints(font_index.load(jp_font_path))
+    jp_codepoints |= read_sfd_codepoints(
+        f"{SOURCE_FONTS_DIR}/biz-ud-gothic/custom_glyphs-{jp_style}.sfd"
+    )
+    if options.get("discord"):
+        jp_codepoints |= read_sfd_codepoints(
+            f"{SOURCE_FONTS_DIR}/biz-ud-gothic/custom_glyphs_discord-{jp_style}.sfd"
+        )
+    eng_codepoints = font_index.codepoints(
+        font_index.load(f"{SOURCE_FONTS_DIR}/{ENG_FONT.replace('{style}', eng_style)}")
+    )
+    eng_codepoints |= read_sfd_codepoints(
+        f"{SOURCE_FONTS_DIR}/inconsolata/custom_glyphs-{eng_style}.sfd"
+    )
+    nerd_codepoints = None
+    if options.get("nerd-font"):
+        nerd_codepoints = font_index.codepoints(
+            font_index.load(f"{SOURCE_FONTS_DIR}/SymbolsNerdFont-Regular.ttf")
+        )
+    return make_plan(
+        jp_codepoints,
+        eng_codepoints,
+        nerd_codepoints,
+        # Nerd Fonts 版では日本語文書に頻出する記号も英語フォントのグリフを使う
+        remove_jpdoc_symbols=not options.get("nerd-font"),
+    )
+
+
+def get_jp_subset_removal(plan: dict) -> set:
+    """subset_script.py で日本語フォントから削除する、他のフォントのグリフで置き換える符号位置を返す"""
+    return plan["remove"]["jp_duplicate"] | plan["remove"]["jp_nerd"]
+
+
+def to_ranges(codepoints, present=None) -> list:
+    """符号位置を (開始, 終了) の範囲のリストにまとめる
+    present を指定した場合、present に含まれない符号位置を挟んでいても1つの範囲とする"""
+    selected = set(codepoints)
+    contiguous = present is None
+    if contiguous:
+        present = selected
+    ranges = []
+    start = end = None
+    for code in sorted(present | selected):
+        if code in selected:
+            # 面をまたぐ範囲は作らない
+            if (
+                start is not None
+                and code >> 16 == start >> 16
+                and (not contiguous or code == end + 1)
+            ):
+                end = code
+            else:
+                if start is not None:
+                    ranges.append((start, end))
+                start = end = code
+        elif start is not None:
+            ranges.append((start, end))
+            start = end = None
+    if start is not None:
+        ranges.append((start, end))
+    return ranges
+
+
+def select(font, codepoints, present=None):
+    """符号位置のグリフを範囲選択でまとめて選択する
+    範囲の両端は present に含まれる (フォントに存在する) 符号位置となる"""
+    font.selection.none()
+    # Unicode (BMP) エンコーディングのフォントでは、BMP 外のグリフは符号位置順に並ばない
+    full_encoding = font.encoding.startswith("UnicodeFull")
+    for start, end in to_ranges(codepoints, present):
+        if end < 0x10000 or full_encoding:
+            font.selection.select(("more", "unicode", "ranges"), start, end)
+        else:
+            for code in sorted(c for c in codepoints if start <= c <= end):
+                font.selection.select(("more", "unicode"), code)
+    return font.selection
+
+
+def format_ranges(codepoints) -> str:
+    """符号位置を U+XXXX-U+XXXX 形式の範囲の文字列にする"""
+    return ", ".join(
+        f"U+{start:04X}" if start == end else f"U+{start:04X}-U+{end:04X}"
+        for start, end in to_ranges(codepoints)
+    )
+
+
+def print_plan(plan: dict):
+    """符号位置の割り当て結果と、各フォントから削除する範囲を表示する"""
+    owner = plan["owner"]
+    print(
+        "codepoint plan: "
+        + ", ".join(f"{name} {len(owner[name])}" for name in ("eng", "jp", "nerd"))
+    )
+    for name, codepoints in plan["remove"].items():
+        if not codepoints:
+            continue
+        print(f"  remove {name}: {len(codepoints)} ({format_ranges(codepoints)})")
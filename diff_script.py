@@ -0,0 +1,244 @@
+#!/bin/env python3
+
+# 2つのビルド (またはリリース) のフォントを比較し、追加・削除・変更された符号位置を表示する
+# TTX に書き出さず、符号位置ごとに輪郭のハッシュ・送り幅・異体字シーケンスを、
+# テーブルごとに別プロセスで求めて比較する。差分がある場合は終了コード 1 で終了する。
+
+import glob
+import hashlib
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from fontTools import ttLib
+
+import codepoint_plan
+
+# 比較するテーブル (OS/2, post は fonttools_script.py で編集する値を含む全項目)
+TABLES = ["glyf", "hmtx", "cmap_format_14", "OS/2", "post"]
+
+options = {}
+
+
+def main():
+    # オプション判定
+    get_options()
+    if options.get("unknown-option") or len(options.get("paths", [])) != 2:
+        usage()
+        sys.exit(2)
+
+    old_path, new_path = options["paths"]
+    if not diff_fonts(old_path, new_path):
+        sys.exit(1)
+
+
+def usage():
+    print(f"Usage: {sys.argv[0]} OLD NEW [--jobs=N]")
+    print("  OLD, NEW: font files or directories (e.g. build, release_files/build_*)")
+
+
+def get_options():
+    """オプションを取得する"""
+
+    global options
+
+    options["paths"] = []
+    for arg in sys.argv[1:]:
+        # オプション判定
+        if arg.startswith("--jobs="):
+            # テーブルを並列に読み込むプロセス数
+            options["jobs"] = int(arg.split("=")[1])
+        elif arg.startswith("--"):
+            options["unknown-option"] = True
+            return
+        else:
+            options["paths"].append(arg)
+
+
+def find_fonts(path: str) -> dict:
+    """ディレクトリ内の比較するフォントを {ファイル名: パス} の形で返す
+    サブディレクトリ (リリース用のフォルダ構成) も含めて探す"""
+    return {
+        os.path.basename(font_path): font_path
+        for font_path in sorted(glob.glob(f"{path}/**/*.ttf", recursive=True))
+    }
+
+
+def diff_fonts(old_path: str, new_path: str) -> bool:
+    """2つのビルドのフォントを比較して差分を表示し、差分が無ければ True を返す"""
+    if os.path.isfile(old_path) and os.path.isfile(new_path):
+        # ファイル同士の比較ではファイル名が異なっていてもよい
+        old_fonts = {"": old_path}
+        new_fonts = {"": new_path}
+    else:
+        old_fonts = find_fonts(old_path)
+        new_fonts = find_fonts(new_path)
+
+    identical = True
+    for name in sorted(old_fonts.keys() - new_fonts.keys()):
+        print(f"removed font: {name}")
+        identical = False
+    for name in sorted(new_fonts.keys() - old_fonts.keys()):
+        print(f"added font: {name}")
+        identical = False
+
+    # (フォント, テーブル) ごとに別プロセスで要約する
+    names = sorted(old_fonts.keys() & new_fonts.keys())
+    tasks = [
+        (fonts[name], table)
+        for name in names
+        for fonts in (old_fonts, new_fonts)
+        for table in TABLES
+    ]
+    jobs = max(1, min(options.get("jobs", os.cpu_count() or 1), len(tasks)))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {task: executor.submit(summarize_table, *task) for task in tasks}
+        summaries = {task: future.result() for task, future in futures.items()}
+
+    for name in names:
+        old_summary = {table: summaries[(old_fonts[name], table)] for table in TABLES}
+        new_summary = {table: summaries[(new_fonts[name], table)] for table in TABLES}
+        lines = diff_summaries(old_summary, new_summary)
+        label = name or f"{old_path} -> {new_path}"
+        if lines:
+            identical = False
+            print(f"== {label}")
+            for line in lines:
+                print(f"  {line}")
+        else:
+            print(f"== {label}: identical")
+    return identical
+
+
+def summarize_table(path: str, table: str) -> dict:
+    """フォントの1つのテーブルを、比較用の {キー: 値} の形に要約する (ワーカープロセスから呼ばれる)
+    グリフ名は変わりうるため、グリフは符号位置 (異体字シーケンス) をキーとする"""
+    font = ttLib.TTFont(path, lazy=True)
+    if table in ("OS/2", "post"):
+        summary = get_table_fields(font, table)
+    elif table == "cmap_format_14":
+        summary = {}
+        for subtable in font["cmap"].tables:
+            if subtable.format != 14:
+                continue
+            for variation_selector, mappings in subtable.uvsDict.items():
+                for code, glyph_name in mappings:
+                    # glyph_name が None のものは通常の cmap と同じグリフを使う
+                    summary[(code, variation_selector)] = (
+                        "default"
+                        if glyph_name is None
+                        else get_outline_hash(font, glyph_name)
+                    )
+    elif table == "glyf":
+        summary = {
+            code: get_outline_hash(font, glyph_name)
+            for code, glyph_name in font.getBestCmap().items()
+        }
+    elif table == "hmtx":
+        hmtx = font["hmtx"]
+        summary = {
+            code: hmtx[glyph_name][0] for code, glyph_name in font.getBestCmap().items()
+        }
+    font.close()
+    return summary
+
+
+def get_outline_hash(font: ttLib.TTFont, glyph_name: str) -> str:
+    """正規化したグリフの輪郭のハッシュを返す
+    複合グリフは参照先を展開した座標とし、ヒンティングの命令は含めない"""
+    glyf = font["glyf"]
+    coordinates, end_points, flags = glyf[glyph_name].getCoordinates(glyf)
+    digest = hashlib.sha1()
+    digest.update(coordinates.array.tobytes())
+    digest.update(repr(list(end_points)).encode())
+    digest.update(bytes(flag & 0x01 for flag in flags))
+    return digest.hexdigest()
+
+
+def get_table_fields(font: ttLib.TTFont, table: str) -> dict:
+    """OS/2, post テーブルの各項目を返す"""
+    if table not in font:
+        return {}
+    fields = {}
+    for key, value in vars(font[table]).items():
+        if key.startswith("_") or key in ("tableTag", "data", "glyphOrder"):
+            continue
+        if key == "panose":
+            value = vars(value)
+        elif key in ("extraNames", "mapping"):
+            # post format 2 のグリフ名は比較しない
+            continue
+        fields[key] = value
+    return fields
+
+
+def diff_summaries(old: dict, new: dict) -> list:
+    """2つのフォントの要約を比較し、差分を表す行のリストを返す"""
+    lines = []
+    old_codes = set(old["glyf"])
+    new_codes = set(new["glyf"])
+    if new_codes - old_codes:
+        lines.append(
+            f"added {len(new_codes - old_codes)}: "
+            + codepoint_plan.format_ranges(new_codes - old_codes)
+        )
+    if old_codes - new_codes:
+        lines.append(
+            f"removed {len(old_codes - new_codes)}: "
+            + codepoint_plan.format_ranges(old_codes - new_codes)
+        )
+    for table, label in (("glyf", "outline"), ("hmtx", "advance width")):
+        changed = {
+            code
+            for code in old_codes & new_codes
+            if old[table][code] != new[table][code]
+        }
+        if changed:
+            lines.append(
+                f"changed {label} {len(changed)}: "
+                + codepoint_plan.format_ranges(changed)
+            )
+
+    # 異体字シーケンス
+    old_uvs = old["cmap_format_14"]
+    new_uvs = new["cmap_format_14"]
+    for label, sequences in (
+        ("added", new_uvs.keys() - old_uvs.keys()),
+        ("removed", old_uvs.keys() - new_uvs.keys()),
+        (
+            "changed",
+            {
+                key
+                for key in old_uvs.keys() & new_uvs.keys()
+                if old_uvs[key] != new_uvs[key]
+            },
+        ),
+    ):
+        if sequences:
+            lines.append(
+                f"{label} variation sequences {len(sequences)}: "
+                + format_sequences(sequences)
+            )
+
+    for table in ("OS/2", "post"):
+        for key in sorted(old[table].keys() | new[table].keys()):
+            old_value = old[table].get(key)
+            new_value = new[table].get(key)
+            if old_value != new_value:
+                lines.append(f"{table}.{key}: {old_value} -> {new_value}")
+    return lines
+
+
+def format_sequences(sequences, limit=10) -> str:
+    """異体字シーケンスを U+XXXX U+XXXXX 形式の文字列にする (多い場合は省略する)"""
+    formatted = [
+        f"U+{code:04X} U+{variation_selector:04X}"
+        for code, variation_selector in sorted(sequences)
+    ]
+    if len(formatted) > limit:
+        formatted = formatted[:limit] + [f"... ({len(sequences) - limit} more)"]
+    return ", ".join(formatted)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+#!/bin/env python3
+
+# ソースフォントの符号位置・グリフ名・送り幅・異体字の索引
+# 索引は source_fonts/.index 以下に JSON で保存し、フォントの内容が変わったときだけ作り直す。
+# source_fonts 以外のフォント (日本語フォントのサブセットなど) の索引はビルドキャッシュに保存する。
+# fontforge_script.py (FontForge 組み込みの Python) からも使うため、標準ライブラリのみに依存する
+
+import configparser
+import json
+import os
+import struct
+import uuid
+
+import build_cache
+
+# iniファイルを読み込む
+settings = configparser.ConfigParser()
+settings.read("build.ini", encoding="utf-8")
+
+SOURCE_FONTS_DIR = settings.get("DEFAULT", "SOURCE_FONTS_DIR")
+INDEX_DIR = f"{SOURCE_FONTS_DIR}/.index"
+
+# 索引の形式を変えたときは更新する
+INDEX_VERSION = 1
+
+# post テーブル format 2 で番号のみで参照される Macintosh 標準グリフ名
+MAC_GLYPH_NAMES = """
+    .notdef .null nonmarkingreturn space exclam quotedbl numbersign dollar percent
+    ampersand quotesingle parenleft parenright asterisk plus comma hyphen period slash
+    zero one two three four five six seven eight nine colon semicolon less equal greater
+    question at A B C D E F G H I J K L M N O P Q R S T U V W X Y Z bracketleft
+    backslash bracketright asciicircum underscore grave a b c d e f g h i j k l m n o p
+    q r s t u v w x y z braceleft bar braceright asciitilde Adieresis Aring Ccedilla
+    Eacute Ntilde Odieresis Udieresis aacute agrave acircumflex adieresis atilde aring
+    ccedilla eacute egrave ecircumflex edieresis iacute igrave icircumflex idieresis
+    ntilde oacute ograve ocircumflex odieresis otilde uacute ugrave ucircumflex
+    udieresis dagger degree cent sterling section bullet paragraph germandbls registered
+    copyright trademark acute dieresis notequal AE Oslash infinity plusminus lessequal
+    greaterequal yen mu partialdiff summation product pi integral ordfeminine
+    ordmasculine Omega ae oslash questiondown exclamdown logicalnot radical florin
+    approxequal Delta guillemotleft guillemotright ellipsis nonbreakingspace Agrave
+    Atilde Otilde OE oe endash emdash quotedblleft quotedblright quoteleft quoteright
+    divide lozenge ydieresis Ydieresis fraction currency guilsinglleft guilsinglright fi
+    fl daggerdbl periodcentered quotesinglbase quotedblbase perthousand Acircumflex
+    Ecircumflex Aacute Edieresis Egrave Iacute Icircumflex Idieresis Igrave Oacute
+    Ocircumflex apple Ograve Uacute Ucircumflex Ugrave dotlessi circumflex tilde macron
+    breve dotaccent ring cedilla hungarumlaut ogonek caron Lslash lslash Scaron scaron
+    Zcaron zcaron brokenbar Eth eth Yacute yacute Thorn thorn minus multiply onesuperior
+    twosuperior threesuperior onehalf onequarter threequarters franc Gbreve gbreve
+    Idotaccent Scedilla scedilla Cacute cacute Ccaron ccaron dcroat
+""".split()
+
+
+def load(path: str) -> dict:
+    """フォントの索引を返す。索引が無いかフォントの内容が変わっている場合は作り直す
+    cmap は {符号位置: GID}、uvs は [符号位置, 異体字セレクタ, GID] のリストとし、
+    uvs の GID が None のものは cmap のグリフをそのまま使う (default UVS)"""
+    font_hash = build_cache.file_hash(path)
+    index_path = get_index_path(path, font_hash)
+    if os.path.exists(index_path):
+        with open(index_path, encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") == INDEX_VERSION and index.get("hash") == font_hash:
+            return decode(index)
+
+    print(f"Build font index {path}")
+    index = build(path)
+    index["version"] = INDEX_VERSION
+    index["hash"] = font_hash
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    # 並列ビルドで同じ索引を作っても壊れたファイルを読まないよう、一時ファイルから置き換える
+    tmp_path = f"{index_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(encode(index), f, ensure_ascii=False)
+    os.replace(tmp_path, index_path)
+    return index
+
+
+def get_index_path(path: str, font_hash: str) -> str:
+    """フォントの索引の保存先を返す
+    source_fonts 以外のフォントはビルドごとに作られる一時ファイルのため、
+    source_fonts/.index に索引を残さず、ビルドキャッシュに内容のハッシュ値をキーとして保存する"""
+    relative_path = os.path.relpath(path, SOURCE_FONTS_DIR)
+    if relative_path.startswith(".."):
+        return build_cache.entry_path("font_index", font_hash, "index.json")
+    return f"{INDEX_DIR}/{relative_path}.json"
+
+
+def encode(index: dict) -> dict:
+    """JSON に保存するため、cmap のキーを文字列にする"""
+    return {**index, "cmap": {str(code): gid for code, gid in index["cmap"].items()}}
+
+
+def decode(index: dict) -> dict:
+    """JSON から読み込んだ索引の cmap のキーを符号位置に戻す"""
+    return {**index, "cmap": {int(code): gid for code, gid in index["cmap"].items()}}
+
+
+def build(path: str) -> dict:
+    """TrueType フォントを読み込んで索引を作る"""
+    with open(path, "rb") as f:
+        data = f.read()
+    tables = {}
+    num_tables = struct.unpack_from(">H", data, 4)[0]
+    for i in range(num_tables):
+        tag, _, offset, _ = struct.unpack_from(">4sIII", data, 12 + i * 16)
+        tables[tag.decode("latin-1")] = offset
+
+    num_glyphs = struct.unpack_from(">H", data, tables["maxp"] + 4)[0]
+    cmap, uvs = read_cmap(data, tables["cmap"])
+    return {
+        "units_per_em": struct.unpack_from(">H", data, tables["head"] + 18)[0],
+        "glyph_names": read_glyph_names(data, tables.get("post"), num_glyphs),
+        "advance_widths": read_advance_widths(
+            data, tables["hhea"], tables["hmtx"], num_glyphs
+        ),
+        "cmap": cmap,
+        "uvs": uvs,
+    }
+
+
+def read_advance_widths(data: bytes, hhea_offset: int, hmtx_offset: int, num_glyphs):
+    """hmtx テーブルから GID ごとの送り幅を読む"""
+    num_metrics = struct.unpack_from(">H", data, hhea_offset + 34)[0]
+    advance_widths = [
+        struct.unpack_from(">H", data, hmtx_offset + i * 4)[0]
+        for i in range(num_metrics)
+    ]
+    # numberOfHMetrics 以降のグリフは最後の送り幅と同じ
+    return advance_widths + [advance_widths[-1]] * (num_glyphs - num_metrics)
+
+
+def read_glyph_names(data: bytes, post_offset, num_glyphs: int) -> list:
+    """post テーブルから GID ごとのグリフ名を読む。名前が無い場合は None とする"""
+    if post_offset is None:
+        return [None] * num_glyphs
+    version = struct.unpack_from(">I", data, post_offset)[0]
+    if version == 0x00010000:
+        return (MAC_GLYPH_NAMES + [None] * num_glyphs)[:num_glyphs]
+    if version != 0x00020000:
+        return [None] * num_glyphs
+    name_count = struct.unpack_from(">H", data, post_offset + 32)[0]
+    name_indices = struct.unpack_from(f">{name_count}H", data, post_offset + 34)
+    # 標準グリフ名以外の名前は Pascal 文字列で順に格納されている
+    extra_names = []
+    offset = post_offset + 34 + name_count * 2
+    while len(extra_names) < max(name_indices, default=0) - 257:
+        length = data[offset]
+        extra_names.append(data[offset + 1 : offset + 1 + length].decode("latin-1"))
+        offset += 1 + length
+    names = [
+        MAC_GLYPH_NAMES[i] if i < 258 else extra_names[i - 258] for i in name_indices
+    ]
+    return (names + [None] * num_glyphs)[:num_glyphs]
+
+
+def read_cmap(data: bytes, cmap_offset: int):
+    """cmap テーブルから Unicode の対応と異体字シーケンスを読む
+    Unicode のサブテーブルのうち、format 12 があればそれを、なければ format 4 を使う"""
+    subtables = {}
+    num_subtables = struct.unpack_from(">H", data, cmap_offset + 2)[0]
+    for i in range(num_subtables):
+        platform_id, encoding_id, offset = struct.unpack_from(
+            ">HHI", data, cmap_offset + 4 + i * 8
+        )
+        if platform_id == 0 or (platform_id == 3 and encoding_id in (1, 10)):
+            subtable_offset = cmap_offset + offset
+            subtable_format = struct.unpack_from(">H", data, subtable_offset)[0]
+            subtables.setdefault(subtable_format, subtable_offset)
+
+    cmap = {}
+    if 12 in subtables:
+        cmap = read_cmap_format_12(data, subtables[12])
+    elif 4 in subtables:
+        cmap = read_cmap_format_4(data, subtables[4])
+    uvs = []
+    if 14 in subtables:
+        uvs = read_cmap_format_14(data, subtables[14])
+    return cmap, uvs
+
+
+def read_cmap_format_4(data: bytes, offset: int) -> dict:
+    """cmap format 4 のサブテーブルを読む"""
+    seg_count = struct.unpack_from(">H", data, offset + 6)[0] // 2
+    end_codes_offset = offset + 14
+    start_codes_offset = end_codes_offset + seg_count * 2 + 2
+    id_deltas_offset = start_codes_offset + seg_count * 2
+    id_range_offsets_offset = id_deltas_offset + seg_count * 2
+    end_codes = struct.unpack_from(f">{seg_count}H", data, end_codes_offset)
+    start_codes = struct.unpack_from(f">{seg_count}H", data, start_codes_offset)
+    id_deltas = struct.unpack_from(f">{seg_count}H", data, id_deltas_offset)
+    id_range_offsets = struct.unpack_from(
+        f">{seg_count}H", data, id_range_offsets_offset
+    )
+
+    cmap = {}
+    for i in range(seg_count):
+        start, end = start_codes[i], end_codes[i]
+        if start == 0xFFFF:
+            continue
+        for code in range(start, end + 1):
+            if id_range_offsets[i] == 0:
+                gid = (code + id_deltas[i]) & 0xFFFF
+            else:
+                gid_offset = (
+                    id_range_offsets_offset
+                    + i * 2
+                    + id_range_offsets[i]
+                    + (code - start) * 2
+                )
+                gid = struct.unpack_from(">H", data, gid_offset)[0]
+                if gid != 0:
+                    gid = (gid + id_deltas[i]) & 0xFFFF
+            # .notdef に割り当てられた符号位置はグリフが無いものとみなす
+            if gid != 0:
+                cmap[code] = gid
+    return cmap
+
+
+def read_cmap_format_12(data: bytes, offset: int) -> dict:
+    """cmap format 12 のサブテーブルを読む"""
+    num_groups = struct.unpack_from(">I", data, offset + 12)[0]
+    cmap = {}
+    for i in range(num_groups):
+        start, end, start_gid = struct.unpack_from(">III", data, offset + 16 + i * 12)
+        for code in range(start, end + 1):
+            gid = start_gid + code - start
+            if gid != 0:
+                cmap[code] = gid
+    return cmap
+
+
+def read_cmap_format_14(data: bytes, offset: int) -> list:
+    """cmap format 14 (異体字シーケンス) のサブテーブルを読む"""
+    uvs = []
+    num_records = struct.unpack_from(">I", data, offset + 6)[0]
+    for i in range(num_records):
+        record_offset = offset + 10 + i * 11
+        selector = int.from_bytes(data[record_offset : record_offset + 3], "big")
+        default_offset, non_default_offset = struct.unpack_from(
+            ">II", data, record_offset + 3
+        )
+        if default_offset:
+            table_offset = offset + default_offset
+            num_ranges = struct.unpack_from(">I", data, table_offset)[0]
+            for j in range(num_ranges):
+                range_offset = table_offset + 4 + j * 4
+                start = int.from_bytes(data[range_offset : range_offset + 3], "big")
+                for code in range(start, start + data[range_offset + 3] + 1):
+                    uvs.append([code, selector, None])
+        if non_default_offset:
+            table_offset = offset + non_default_offset
+            num_mappings = struct.unpack_from(">I", data, table_offset)[0]
+            for j in range(num_mappings):
+                mapping_offset = table_offset + 4 + j * 5
+                code = int.from_bytes(data[mapping_offset : mapping_offset + 3], "big")
+                gid = struct.unpack_from(">H", data, mapping_offset + 3)[0]
+                uvs.append([code, selector, gid])
+    return uvs
+
+
+def codepoints(index: dict) -> set:
+    """索引のフォントに含まれる符号位置を返す"""
+    return set(index["cmap"])
+
+
+def advance_width(index: dict, code: int):
+    """符号位置のグリフの送り幅を返す。グリフが無い場合は None を返す"""
+    gid = index["cmap"].get(code)
+    if gid is None:
+        return None
+    return index["advance_widths"][gid]
+
+
+def altuni(index: dict) -> dict:
+    """複数の符号位置から参照されるグリフを {GID: [符号位置, ...]} の形で返す
+    FontForge ではこれらは1つのグリフの Alternate Unicode として扱われる"""
+    codes_by_gid = {}
+    for code, gid in sorted(index["cmap"].items()):
+        codes_by_gid.setdefault(gid, []).append(code)
+    return {gid: codes for gid, codes in codes_by_gid.items() if len(codes) > 1}
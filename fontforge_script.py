@@ -3,16 +3,25 @@
 # 2つのフォントを合成する
 
 import configparser
+import json
+import multiprocessing
 import os
 import shutil
 import sys
 import uuid
+from concurrent.futures import ProcessPoolExecutor
 from decimal import ROUND_HALF_UP, Decimal
 from math import radians
 
 import fontforge
 import psMat
 
+import build_cache
+import build_report
+import codepoint_plan
+import font_index
+import transform_plan
+
 # iniファイルを読み込む
 settings = configparser.ConfigParser()
 settings.read("build.ini", encoding="utf-8")
@@ -52,6 +61,30 @@ Copyright (c) 2014, Ryan L McIntyre https://ryanlmcintyre.com
 Copyright 2022 Yuko Otawara
 """  # noqa: E501
 
+# スタイル名と、合成元の (日本語フォント, 英語フォント) のスタイル名の対応
+STYLES = {
+    "Regular": ("Regular", "Medium"),
+    "Bold": ("Bold", "Bold"),
+}
+
+# 生成されるフォントに影響しないオプション (キャッシュキーに含めない)
+RUNTIME_OPTIONS = {
+    "do-not-delete-build-dir",
+    "styles",
+    "jobs",
+    "no-cache",
+    "prepare-assets",
+    "prepare-checkpoint",
+    "profile",
+    "dry-run",
+    # 日本語フォントの内容はファイルのハッシュ値でキャッシュキーに含める
+    "jp-source",
+}
+
+# make.py でビルドする全バリアントに共通する最後の処理段階
+# --prepare-checkpoint はこの段階までを実行してチェックポイントを保存する
+SHARED_LAST_STAGE = "adjust_some_glyph"
+
 options = {}
 hack_font = None
 nerd_font = None
@@ -64,6 +97,18 @@ def main():
         usage()
         return
 
+    # フォントを開かずに、各処理の対象となる符号位置を表示する
+    if options.get("dry-run"):
+        for merged_style in options.get("styles", list(STYLES.keys())):
+            dry_run(merged_style)
+        return
+
+    # 各ビルドで共通して使うアセットを事前に作成してキャッシュする
+    if options.get("prepare-assets"):
+        os.makedirs(BUILD_FONTS_DIR, exist_ok=True)
+        prepare_assets()
+        return
+
     # buildディレクトリを作成する
     if os.path.exists(BUILD_FONTS_DIR) and not options.get("do-not-delete-build-dir"):
         shutil.rmtree(BUILD_FONTS_DIR)
@@ -71,22 +116,34 @@ def main():
     if not os.path.exists(BUILD_FONTS_DIR):
         os.mkdir(BUILD_FONTS_DIR)
 
-    generate_font(
-        jp_style="Regular",
-        eng_style="Medium",
-        merged_style="Regular",
-    )
-    generate_font(
-        jp_style="Bold",
-        eng_style="Bold",
-        merged_style="Bold",
-    )
+    # スタイルごとに別プロセスで生成する
+    styles = options.get("styles", list(STYLES.keys()))
+    jobs = min(options.get("jobs", os.cpu_count() or 1), len(styles))
+    if jobs <= 1:
+        for merged_style in styles:
+            generate_style(merged_style, options)
+        return
+    # FontForge 組み込みの Python でも子プロセスを起動できるよう、可能なら fork を使う
+    if "fork" in multiprocessing.get_all_start_methods():
+        mp_context = multiprocessing.get_context("fork")
+    else:
+        mp_context = multiprocessing.get_context()
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=mp_context) as executor:
+        futures = [
+            executor.submit(generate_style, merged_style, options)
+            for merged_style in styles
+        ]
+        for future in futures:
+            future.result()
 
 
 def usage():
     print(
         f"Usage: {sys.argv[0]} "
-        "[--invisible-zenkaku-space] [--35] [--jpdoc] [--nerd-font]"
+        "[--invisible-zenkaku-space] [--35] [--jpdoc] [--nerd-font] "
+        "[--styles=Regular,Bold] [--jobs=N] [--no-cache] [--prepare-assets] "
+        "[--profile] [--jp-scale-backend=fontforge|fonttools] [--dry-run] "
+        "[--jp-source=PATH] [--prepare-checkpoint]"
     )
 
 
@@ -113,56 +170,512 @@ def get_options():
             options["discord"] = True
         elif arg.startswith("--discord-ignore="):
             options["discord-ignore-char-list"] = arg.split("=")[1]
+        elif arg.startswith("--styles="):
+            # 生成するスタイルをカンマ区切りで指定する
+            styles = arg.split("=")[1].split(",")
+            if not all(style in STYLES for style in styles):
+                options["unknown-option"] = True
+                return
+            options["styles"] = styles
+        elif arg.startswith("--jobs="):
+            # スタイルを並列に生成するプロセス数
+            options["jobs"] = int(arg.split("=")[1])
+        elif arg == "--no-cache":
+            options["no-cache"] = True
+        elif arg == "--prepare-assets":
+            options["prepare-assets"] = True
+        elif arg == "--prepare-checkpoint":
+            # 各バリアントで共通の処理段階までを実行し、チェックポイントのみを保存する
+            options["prepare-checkpoint"] = True
+        elif arg == "--profile":
+            # 処理段階ごとに cProfile の結果を出力する
+            options["profile"] = True
+        elif arg.startswith("--jp-scale-backend="):
+            # 日本語フォントの縮小・位置調整を FontForge と fonttools のどちらで行うか
+            backend = arg.split("=")[1]
+            if backend not in ("fontforge", "fonttools"):
+                options["unknown-option"] = True
+                return
+            options["jp-scale-backend"] = backend
+        elif arg == "--dry-run":
+            options["dry-run"] = True
+        elif arg.startswith("--jp-source="):
+            # subset_script.py で作成した合成元の日本語フォント
+            # ({style} は日本語フォントのスタイル名に置き換える)
+            options["jp-source"] = arg.split("=", 1)[1]
         else:
             options["unknown-option"] = True
             return
 
 
+def prepare_assets():
+    """スタイルごとの半角幅に合わせた Nerd Font をキャッシュに作成する
+    並列ビルドの各プロセスが同じ調整処理を重複して行わないよう、ビルド前に1度だけ実行する"""
+    for _, eng_style in STYLES.values():
+        eng_font = fontforge.open(
+            SOURCE_FONTS_DIR + "/" + ENG_FONT.replace("{style}", eng_style)
+        )
+        adjust_em(eng_font)
+        open_nerd_font(eng_font[0x0030].width).close()
+        eng_font.close()
+
+
+def dry_run(merged_style):
+    """ソースフォントの索引から、指定したオプションで削除・縮小・置換される符号位置を表示する
+    FontForge でフォントを開かないため、カスタムグリフ適用前の幅で判定する"""
+    print(f"=== Dry run {merged_style} ===")
+    jp_style, eng_style = STYLES[merged_style]
+    # 削除する符号位置
+    plan = make_codepoint_plan(jp_style, eng_style)
+
+    jp_index = font_index.load(get_jp_font_path(jp_style))
+    jp_kept = plan["present"]["jp"] - plan["remove"]["jp_duplicate"]
+    # Alternate Unicode から実体のグリフを作る符号位置
+    altuni_copies = {
+        code for codes in font_index.altuni(jp_index).values() for code in codes[1:]
+    }
+    print_codepoints("copy jp altuni", altuni_copies)
+
+    # カスタムグリフで置き換える符号位置
+    replaced = {
+        "eng custom_glyphs": f"inconsolata/custom_glyphs-{eng_style}.sfd",
+        "jp custom_glyphs": f"biz-ud-gothic/custom_glyphs-{jp_style}.sfd",
+    }
+    if options.get("discord"):
+        replaced["jp custom_glyphs_discord"] = (
+            f"biz-ud-gothic/custom_glyphs_discord-{jp_style}.sfd"
+        )
+    if not options.get("invisible-zenkaku-space"):
+        replaced["jp zenkaku space"] = IDEOGRAPHIC_SPACE
+    for name, path in replaced.items():
+        print_codepoints(
+            f"replace {name}",
+            codepoint_plan.read_sfd_codepoints(f"{SOURCE_FONTS_DIR}/{path}"),
+        )
+    if options.get("nerd-font"):
+        print_codepoints(
+            "replace nerd font",
+            plan["remove"]["jp_nerd"] | plan["remove"]["eng_nerd"],
+        )
+
+    # 縮小する符号位置
+    print_codepoints(f"shrink jp ({JP_SCALE})", jp_kept)
+    if options.get("nerd-font"):
+        for name, ranges in [
+            ("shrink eaw", codepoint_plan.EAW_SHRINK),
+            ("move eaw", codepoint_plan.EAW_MOVE),
+            ("width eaw", codepoint_plan.EAW_WIDTH_ONLY),
+            ("shrink eaw tall", codepoint_plan.EAW_SHRINK_TALL),
+        ]:
+            # 全角幅のグリフのみが対象となる
+            print_codepoints(
+                name,
+                {
+                    code
+                    for code in codepoint_plan.expand_ranges(ranges) & jp_kept
+                    if font_index.advance_width(jp_index, code) == HALF_WIDTH_12 * 2
+                },
+            )
+
+
+def print_codepoints(name, codepoints):
+    """dry-run の結果を1行で表示する"""
+    print(f"  {name}: {len(codepoints)} ({codepoint_plan.format_ranges(codepoints)})")
+
+
+def generate_style(merged_style, options_):
+    """スタイル名に対応するフォントを生成する (ワーカープロセスからも呼ばれる)"""
+    global options
+    # spawn で起動されたプロセスではオプションが引き継がれないため設定し直す
+    options = options_
+
+    jp_style, eng_style = STYLES[merged_style]
+    if options.get("prepare-checkpoint"):
+        prepare_checkpoint(jp_style, eng_style, merged_style)
+        return
+    generate_font(
+        jp_style=jp_style,
+        eng_style=eng_style,
+        merged_style=merged_style,
+    )
+
+
+def prepare_checkpoint(jp_style, eng_style, merged_style):
+    """各バリアントで共通の処理段階までを実行し、チェックポイントを保存する
+    make.py が各ジョブの前に1度だけ実行し、各ジョブはそのチェックポイントから再開する"""
+    print(f"=== Prepare checkpoint {merged_style} ===")
+    report = build_report.BuildReport(
+        "fontforge",
+        f"{FONT_NAME.replace(' ', '')}-{merged_style}",
+        profile=options.get("profile"),
+    )
+    fonts = run_stages(jp_style, eng_style, report, last_stage=SHARED_LAST_STAGE)
+    if fonts is None:
+        print(f"checkpoint {SHARED_LAST_STAGE} already exists")
+        return
+    for font in fonts:
+        font.close()
+
+
 def generate_font(jp_style, eng_style, merged_style):
     print(f"=== Generate {merged_style} ===")
 
-    # 合成するフォントを開く
-    jp_font, eng_font = open_fonts(jp_style, eng_style)
+    # オプション毎の修飾子を追加する
+    variant = get_variant_name()
+    eng_font_path = f"{BUILD_FONTS_DIR}/{FONTFORGE_PREFIX}{FONT_NAME}{variant.replace(' ', '')}-{merged_style}-eng.ttf"
+    jp_font_path = f"{BUILD_FONTS_DIR}/{FONTFORGE_PREFIX}{FONT_NAME}{variant.replace(' ', '')}-{merged_style}-jp.ttf"
+    # 日本語フォントの変換を fonttools_script.py で適用する場合は、変換内容を別ファイルに出力する
+    jp_transforms_path = jp_font_path.replace(".ttf", "-transforms.json")
+    # キャッシュに格納する名前と出力先
+    output_paths = {"eng.ttf": eng_font_path, "jp.ttf": jp_font_path}
+    if options.get("jp-scale-backend") == "fonttools":
+        output_paths["jp-transforms.json"] = jp_transforms_path
+    elif os.path.exists(jp_transforms_path):
+        # 以前のビルドの変換内容が fonttools_script.py で適用されないよう削除する
+        os.remove(jp_transforms_path)
+
+    # 処理段階ごとの実行時間とメモリ使用量を記録する
+    report = build_report.BuildReport(
+        "fontforge",
+        f"{FONT_NAME.replace(' ', '')}{variant.replace(' ', '')}-{merged_style}",
+        profile=options.get("profile"),
+    )
 
-    # フォントのEMを揃える
-    adjust_em(eng_font)
+    # 入力が同じ中間ファイルがキャッシュにあれば FontForge での処理を省略する
+    cache_key = None
+    if not options.get("no-cache"):
+        cache_key = get_font_cache_key(jp_style, eng_style, merged_style)
+        cached_paths = {
+            name: build_cache.get("fontforge", cache_key, name) for name in output_paths
+        }
+        if all(cached_paths.values()):
+            print(f"use cache {cache_key}")
+            with report.stage("restore_cache"):
+                for name, path in output_paths.items():
+                    shutil.copyfile(cached_paths[name], path)
+            report.save()
+            return
+
+    # 合成処理を段階ごとに実行する
+    # 他のバリアントと共通の段階まではチェックポイントから再開する
+    jp_font, eng_font = run_stages(jp_style, eng_style, report)
+
+    with report.stage("apply_transforms"):
+        # 予約済みの変換をまとめて適用する
+        # --jp-scale-backend=fonttools の場合、日本語フォントは生成後に fonttools_script.py で変換する
+        if options.get("jp-scale-backend") != "fonttools":
+            transform_plan.flush(jp_font)
+        transform_plan.flush(eng_font)
+
+    with report.stage("edit_meta_data"):
+        # macOSでのpostテーブルの使用性エラー対策
+        # 重複するグリフ名を持つグリフをリネームする
+        delete_glyphs_with_duplicate_glyph_names(eng_font)
+        delete_glyphs_with_duplicate_glyph_names(jp_font)
+
+        # メタデータを編集する
+        cap_height = int(
+            Decimal(str(eng_font[0x0048].boundingBox()[3])).quantize(
+                Decimal("0"), ROUND_HALF_UP
+            )
+        )
+        x_height = int(
+            Decimal(str(eng_font[0x0078].boundingBox()[3])).quantize(
+                Decimal("0"), ROUND_HALF_UP
+            )
+        )
+        edit_meta_data(eng_font, merged_style, variant, cap_height, x_height)
+        edit_meta_data(jp_font, merged_style, variant, cap_height, x_height)
+
+    with report.stage("generate"):
+        # ttfファイルに保存
+        # ヒンティングはあとで ttfautohint で行う。
+        # flags=("no-hints", "omit-instructions") を使うとヒンティングだけでなく GPOS や GSUB も削除されてしまうので使わない
+        eng_font.generate(eng_font_path)
+        if options.get("jp-scale-backend") == "fonttools":
+            # リネーム後のグリフ名で変換内容を出力する
+            with open(jp_transforms_path, "w", encoding="utf-8") as f:
+                json.dump(transform_plan.export_by_name(jp_font), f)
+        jp_font.generate(jp_font_path)
+
+        # ttfを閉じる
+        jp_font.close()
+        eng_font.close()
+
+    # 次回以降のビルドのためにキャッシュする
+    if cache_key is not None:
+        with report.stage("save_cache"):
+            for name, path in output_paths.items():
+                build_cache.put("fontforge", cache_key, name, path)
+
+    report.save()
+
+
+def get_stages(jp_style, eng_style):
+    """フォントを開いた後に順に実行する処理段階のリストを返す
+    各要素は (段階名, 段階の処理結果に影響する入力, 処理, チェックポイントを保存するか) とする。
+    チェックポイントは make.py でビルドする複数のバリアントで共通になる段階の後でのみ保存する。"""
+    custom_glyphs = [
+        f"{SOURCE_FONTS_DIR}/inconsolata/custom_glyphs-{eng_style}.sfd",
+        f"{SOURCE_FONTS_DIR}/biz-ud-gothic/custom_glyphs-{jp_style}.sfd",
+    ]
+    discord_custom_glyphs = (
+        f"{SOURCE_FONTS_DIR}/biz-ud-gothic/custom_glyphs_discord-{jp_style}.sfd"
+    )
 
+    # 各符号位置をどのフォントのグリフで表示するかを事前に決める
+    plan = make_codepoint_plan(jp_style, eng_style)
+
+    # フォントのEMを揃える
+    stages = [("adjust_em", None, lambda jp_font, eng_font: adjust_em(eng_font), False)]
     # 日本語文書に頻出する記号を英語フォントから削除する
     if not options.get("nerd-font"):
-        remove_jpdoc_symbols(eng_font)
-
+        stages.append(
+            (
+                "remove_jpdoc_symbols",
+                None,
+                lambda jp_font, eng_font: remove_jpdoc_symbols(eng_font, plan),
+                False,
+            )
+        )
     # いくつかのグリフ形状に調整を加える
-    adjust_some_glyph(jp_font, jp_style, eng_font, eng_style)
-
+    stages.append(
+        (
+            "adjust_some_glyph",
+            [build_cache.file_hash(path) for path in custom_glyphs],
+            lambda jp_font, eng_font: adjust_some_glyph(
+                jp_font, jp_style, eng_font, eng_style
+            ),
+            True,
+        )
+    )
     # Discord用の調整
     if options.get("discord"):
-        create_discord(eng_font, jp_font, jp_style)
+        stages.append(
+            (
+                "create_discord",
+                [
+                    build_cache.file_hash(discord_custom_glyphs),
+                    options.get("discord-ignore-char-list"),
+                ],
+                lambda jp_font, eng_font: create_discord(eng_font, jp_font, jp_style),
+                False,
+            )
+        )
+    stages += [
+        # 重複するグリフを削除する
+        (
+            "delete_duplicate_glyphs",
+            None,
+            lambda jp_font, eng_font: delete_duplicate_glyphs(jp_font, plan),
+            False,
+        ),
+        # 日本語フォントのスケールを調整する
+        (
+            "shrink_jp_font",
+            None,
+            lambda jp_font, eng_font: shrink_jp_font(jp_font),
+            False,
+        ),
+        # GSUB, GPOS テーブル調整
+        (
+            "remove_lookups",
+            None,
+            lambda jp_font, eng_font: remove_lookups(
+                jp_font, remove_gsub=False, remove_gpos=True
+            ),
+            False,
+        ),
+        # inconsolata 連続するバッククォートで grave.case が使われるのを防ぐ
+        (
+            "remove_ccmp_lookups",
+            None,
+            lambda jp_font, eng_font: remove_ccmp_lookups(eng_font),
+            False,
+        ),
+    ]
+    # 全角スペースを可視化する
+    if not options.get("invisible-zenkaku-space"):
+        stages.append(
+            (
+                "visualize_zenkaku_space",
+                build_cache.file_hash(f"{SOURCE_FONTS_DIR}/{IDEOGRAPHIC_SPACE}"),
+                lambda jp_font, eng_font: visualize_zenkaku_space(jp_font),
+                False,
+            )
+        )
+    if options.get("nerd-font"):
+        stages += [
+            # East Asian Ambiguous Width のグリフを半角幅に縮小する
+            (
+                "shrink_east_asian_ambiguous_width",
+                None,
+                lambda jp_font, eng_font: shrink_east_asian_ambiguous_width(jp_font),
+                False,
+            ),
+            # Nerd Fontのグリフを追加する
+            (
+                "add_nerd_font_glyphs",
+                build_cache.file_hash(
+                    f"{SOURCE_FONTS_DIR}/SymbolsNerdFont-Regular.ttf"
+                ),
+                lambda jp_font, eng_font: add_nerd_font_glyphs(jp_font, eng_font, plan),
+                False,
+            ),
+        ]
+    return stages
+
+
+def make_codepoint_plan(jp_style, eng_style):
+    """ソースフォントとカスタムグリフの符号位置から、各フォントで削除する符号位置を決める"""
+    plan = codepoint_plan.make_source_plan(
+        jp_style, eng_style, options, jp_font_path=get_jp_font_path(jp_style)
+    )
+    codepoint_plan.print_plan(plan)
+    return plan
 
-    # 重複するグリフを削除する
-    delete_duplicate_glyphs(jp_font, eng_font)
 
-    # 日本語フォントのスケールを調整する
-    shrink_jp_font(jp_font)
+def get_jp_font_path(jp_style):
+    """合成元の日本語フォントのパスを返す
+    --jp-source を指定した場合は、subset_script.py で不要なグリフを除いたフォントを使う"""
+    return options.get("jp-source", f"{SOURCE_FONTS_DIR}/{JP_FONT}").replace(
+        "{style}", jp_style
+    )
 
-    # GSUB, GPOS テーブル調整
-    remove_lookups(jp_font, remove_gsub=False, remove_gpos=True)
 
-    # inconsolata 連続するバッククォートで grave.case が使われるのを防ぐ
-    for lookup in eng_font.gsub_lookups:
-        if "ccmp" in lookup:
-            eng_font.removeLookup(lookup)
+def run_stages(jp_style, eng_style, report, last_stage=None):
+    """フォントを開き、処理段階を順に実行する
+    各段階のキーはそれまでの全段階の入力から決まるため、同じキーのチェックポイントがあれば
+    最も後ろの段階から処理を再開できる。last_stage を指定した場合はその段階までを実行し、
+    その段階のチェックポイントが既にあれば何もせずに None を返す"""
+    stages = get_stages(jp_style, eng_style)
+    if last_stage is not None:
+        stages = stages[: [stage[0] for stage in stages].index(last_stage) + 1]
+
+    # フォントを開く段階のキーはソースフォントと合成処理の内容で決まる
+    open_fonts_key = build_cache.make_key(
+        get_jp_source_key(jp_style, eng_style),
+        build_cache.file_hash(
+            f"{SOURCE_FONTS_DIR}/{ENG_FONT.replace('{style}', eng_style)}"
+        ),
+        build_cache.file_hash(__file__),
+        build_cache.file_hash(codepoint_plan.__file__),
+        build_cache.file_hash(font_index.__file__),
+        build_cache.file_hash(transform_plan.__file__),
+        build_cache.settings_values(),
+        fontforge.version(),
+    )
+    stage_keys = []
+    key = open_fonts_key
+    for name, params, _, _ in stages:
+        key = build_cache.make_key(key, name, params)
+        stage_keys.append(key)
+    if (
+        last_stage is not None
+        and not options.get("no-cache")
+        and has_checkpoint(stage_keys[-1])
+    ):
+        return None
+
+    # 最も後ろの段階のチェックポイントから再開する
+    start_index = None
+    if not options.get("no-cache"):
+        with report.stage("load_checkpoint"):
+            for i in reversed(range(len(stages))):
+                if stages[i][3]:
+                    fonts = load_checkpoint(stage_keys[i])
+                    if fonts is not None:
+                        print(f"resume from {stages[i][0]}")
+                        jp_font, eng_font = fonts
+                        start_index = i + 1
+                        break
+            if start_index is None:
+                fonts = load_checkpoint(open_fonts_key)
+                if fonts is not None:
+                    print("resume from open_fonts")
+                    jp_font, eng_font = fonts
+                    start_index = 0
+    if start_index is None:
+        # 合成するフォントを開く
+        with report.stage("open_fonts"):
+            jp_font, eng_font = open_fonts(jp_style, eng_style)
+        if not options.get("no-cache"):
+            with report.stage("save_checkpoint_open_fonts"):
+                save_checkpoint(open_fonts_key, jp_font, eng_font)
+        start_index = 0
+
+    for i in range(start_index, len(stages)):
+        name, _, stage, checkpoint = stages[i]
+        with report.stage(name):
+            stage(jp_font, eng_font)
+        if checkpoint and not options.get("no-cache"):
+            with report.stage(f"save_checkpoint_{name}"):
+                save_checkpoint(stage_keys[i], jp_font, eng_font)
 
-    # 全角スペースを可視化する
-    if not options.get("invisible-zenkaku-space"):
-        visualize_zenkaku_space(jp_font)
+    return jp_font, eng_font
 
-    if options.get("nerd-font"):
-        # East Asian Ambiguous Width のグリフを半角幅に縮小する
-        shrink_east_asian_ambiguous_width(jp_font)
-        # Nerd Fontのグリフを追加する
-        add_nerd_font_glyphs(jp_font, eng_font)
 
-    # オプション毎の修飾子を追加する
+def get_jp_source_key(jp_style, eng_style):
+    """フォントを開く段階のキーに含める、合成元の日本語フォントを表す値を返す
+    --jp-source のサブセットはジョブごとに作られるため、ファイルではなく
+    元のフォントとサブセットで削除する符号位置で表し、同じサブセットを使うバリアントでキーを揃える"""
+    source_path = f"{SOURCE_FONTS_DIR}/{JP_FONT.replace('{style}', jp_style)}"
+    if "jp-source" not in options:
+        return build_cache.file_hash(source_path)
+    plan = codepoint_plan.make_source_plan(jp_style, eng_style, options)
+    return [
+        build_cache.file_hash(source_path),
+        sorted(codepoint_plan.get_jp_subset_removal(plan)),
+        build_cache.file_hash("subset_script.py"),
+    ]
+
+
+def has_checkpoint(key) -> bool:
+    """チェックポイントがあるかを返す"""
+    return all(
+        build_cache.get("checkpoint", key, name)
+        for name in ("jp.sfd", "eng.sfd", "transforms.json")
+    )
+
+
+def load_checkpoint(key):
+    """チェックポイントからフォントを開く。チェックポイントが無い場合は None を返す"""
+    if not has_checkpoint(key):
+        return None
+    jp_font = fontforge.open(build_cache.get("checkpoint", key, "jp.sfd"))
+    eng_font = fontforge.open(build_cache.get("checkpoint", key, "eng.sfd"))
+    transforms_path = build_cache.get("checkpoint", key, "transforms.json")
+    # 未適用の変換を復元する
+    with open(transforms_path, encoding="utf-8") as f:
+        transforms = json.load(f)
+    transform_plan.restore(jp_font, transforms["jp"])
+    transform_plan.restore(eng_font, transforms["eng"])
+    return jp_font, eng_font
+
+
+def save_checkpoint(key, jp_font, eng_font):
+    """処理途中のフォントをチェックポイントとして保存する
+    予約済みの変換は適用せず、sfd と別に保存する"""
+    if options.get("no-cache"):
+        return
+    for name, font in [("jp.sfd", jp_font), ("eng.sfd", eng_font)]:
+        font_path = f"{BUILD_FONTS_DIR}/checkpoint_{uuid.uuid4()}.sfd"
+        font.save(font_path)
+        build_cache.put("checkpoint", key, name, font_path, move=True)
+    transforms_path = f"{BUILD_FONTS_DIR}/checkpoint_{uuid.uuid4()}.json"
+    with open(transforms_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "jp": transform_plan.export(jp_font),
+                "eng": transform_plan.export(eng_font),
+            },
+            f,
+        )
+    build_cache.put("checkpoint", key, "transforms.json", transforms_path, move=True)
+
+
+def get_variant_name():
+    """オプション毎の修飾子からバリアント名を作る"""
     variant = f"{DISCORD_STR} " if options.get("discord") else ""
     variant += WIDTH_35_STR if options.get("35") else ""
     variant += (
@@ -170,54 +683,41 @@ def generate_font(jp_style, eng_style, merged_style):
     )
     variant += JPDOC_STR if options.get("jpdoc") else ""
     variant += NERD_FONTS_STR if options.get("nerd-font") else ""
-    variant = variant.strip()
-
-    # macOSでのpostテーブルの使用性エラー対策
-    # 重複するグリフ名を持つグリフをリネームする
-    delete_glyphs_with_duplicate_glyph_names(eng_font)
-    delete_glyphs_with_duplicate_glyph_names(jp_font)
-
-    # メタデータを編集する
-    cap_height = int(
-        Decimal(str(eng_font[0x0048].boundingBox()[3])).quantize(
-            Decimal("0"), ROUND_HALF_UP
-        )
-    )
-    x_height = int(
-        Decimal(str(eng_font[0x0078].boundingBox()[3])).quantize(
-            Decimal("0"), ROUND_HALF_UP
-        )
-    )
-    edit_meta_data(eng_font, merged_style, variant, cap_height, x_height)
-    edit_meta_data(jp_font, merged_style, variant, cap_height, x_height)
-
-    # ttfファイルに保存
-    # ヒンティングはあとで ttfautohint で行う。
-    # flags=("no-hints", "omit-instructions") を使うとヒンティングだけでなく GPOS や GSUB も削除されてしまうので使わない
-    eng_font.generate(
-        f"{BUILD_FONTS_DIR}/{FONTFORGE_PREFIX}{FONT_NAME}{variant.replace(' ', '')}-{merged_style}-eng.ttf",
+    return variant.strip()
+
+
+def get_font_cache_key(jp_style, eng_style, merged_style):
+    """FontForge で生成する中間ファイルのキャッシュキーを作る"""
+    source_paths = [
+        get_jp_font_path(jp_style),
+        f"{SOURCE_FONTS_DIR}/{ENG_FONT.replace('{style}', eng_style)}",
+        f"{SOURCE_FONTS_DIR}/inconsolata/custom_glyphs-{eng_style}.sfd",
+        f"{SOURCE_FONTS_DIR}/biz-ud-gothic/custom_glyphs-{jp_style}.sfd",
+        f"{SOURCE_FONTS_DIR}/biz-ud-gothic/custom_glyphs_discord-{jp_style}.sfd",
+        f"{SOURCE_FONTS_DIR}/{IDEOGRAPHIC_SPACE}",
+        f"{SOURCE_FONTS_DIR}/SymbolsNerdFont-Regular.ttf",
+        # 合成処理そのものが変わった場合も作り直す
+        __file__,
+        codepoint_plan.__file__,
+        font_index.__file__,
+        transform_plan.__file__,
+    ]
+    return build_cache.make_key(
+        {path: build_cache.file_hash(path) for path in source_paths},
+        build_cache.settings_values(),
+        {k: v for k, v in options.items() if k not in RUNTIME_OPTIONS},
+        [jp_style, eng_style, merged_style],
+        fontforge.version(),
     )
-    jp_font.generate(
-        f"{BUILD_FONTS_DIR}/{FONTFORGE_PREFIX}{FONT_NAME}{variant.replace(' ', '')}-{merged_style}-jp.ttf",
-    )
-
-    # ttfを閉じる
-    jp_font.close()
-    eng_font.close()
 
 
 def open_fonts(jp_style: str, eng_style: str):
     """フォントを開く"""
-    jp_font = fontforge.open(
-        SOURCE_FONTS_DIR + "/" + JP_FONT.replace("{style}", jp_style)
-    )
+    jp_font = open_jp_font(jp_style)
     eng_font = fontforge.open(
         SOURCE_FONTS_DIR + "/" + ENG_FONT.replace("{style}", eng_style)
     )
 
-    # fonttools merge エラー対処
-    jp_font = altuni_to_entity(jp_font)
-
     # フォント参照を解除する
     for glyph in jp_font.glyphs():
         if glyph.isWorthOutputting():
@@ -233,8 +733,31 @@ def open_fonts(jp_style: str, eng_style: str):
     return jp_font, eng_font
 
 
-def altuni_to_entity(jp_font):
-    """Alternate Unicodeで透過的に参照して表示している箇所を実体のあるグリフに変換する"""
+def open_jp_font(jp_style: str):
+    """日本語フォントを開き、Alternate Unicode を実体のあるグリフに変換する
+    変換結果はソースフォントとスタイルのみで決まるため、キャッシュがあればそれを開く"""
+    jp_font_path = get_jp_font_path(jp_style)
+
+    cache_key = None
+    if not options.get("no-cache"):
+        cache_key = build_cache.make_key(
+            build_cache.file_hash(jp_font_path),
+            jp_style,
+            build_cache.source_hash(altuni_to_entity),
+            fontforge.version(),
+        )
+        cached_font_path = build_cache.get("altuni_to_entity", cache_key, "jp.ttf")
+        if cached_font_path:
+            print(f"use altuni_to_entity cache {cache_key}")
+            return fontforge.open(cached_font_path)
+
+    # fonttools merge エラー対処
+    return altuni_to_entity(fontforge.open(jp_font_path), cache_key)
+
+
+def altuni_to_entity(jp_font, cache_key=None):
+    """Alternate Unicodeで透過的に参照して表示している箇所を実体のあるグリフに変換する
+    cache_key を指定した場合は、変換後のフォントをキャッシュに格納する"""
     for glyph in jp_font.glyphs():
         if glyph.altuni is not None:
             # 以下形式のタプルで返ってくる
@@ -268,6 +791,12 @@ def altuni_to_entity(jp_font):
     font_path = f"{BUILD_FONTS_DIR}/{jp_font.fullname}_{uuid.uuid4()}.ttf"
     jp_font.generate(font_path)
     jp_font.close()
+    if cache_key is not None:
+        # 一時ファイルをキャッシュに移して開き直す
+        font_path = build_cache.put(
+            "altuni_to_entity", cache_key, "jp.ttf", font_path, move=True
+        )
+        return fontforge.open(font_path)
     reopen_jp_font = fontforge.open(font_path)
     # 一時ファイルを削除
     os.remove(font_path)
@@ -280,18 +809,20 @@ def adjust_some_glyph(jp_font, jp_style, eng_font, eng_style):
     full_width = jp_font[0x3042].width
     for glyph_name in [0xFF08, 0xFF3B, 0xFF5B]:
         glyph = jp_font[glyph_name]
-        glyph.transform(psMat.translate(-(full_width / 6), 0))
+        transform_plan.transform(glyph, psMat.translate(-(full_width / 6), 0))
         glyph.width = full_width
     for glyph_name in [0xFF09, 0xFF3D, 0xFF5D]:
         glyph = jp_font[glyph_name]
-        glyph.transform(psMat.translate((full_width / 6), 0))
+        transform_plan.transform(glyph, psMat.translate((full_width / 6), 0))
         glyph.width = full_width
     # LEFT SINGLE QUOTATION MARK (U+2018) ～ DOUBLE LOW-9 QUOTATION MARK (U+201E) の幅を全角幅にする
     for uni in range(0x2018, 0x201E + 1):
         try:
             glyph = jp_font[uni]
             if glyph.isWorthOutputting():
-                glyph.transform(psMat.translate((full_width - glyph.width) / 2, 0))
+                transform_plan.transform(
+                    glyph, psMat.translate((full_width - glyph.width) / 2, 0)
+                )
                 glyph.width = full_width
         except TypeError:
             # グリフが存在しない場合は継続する
@@ -324,48 +855,42 @@ def adjust_some_glyph(jp_font, jp_style, eng_font, eng_style):
     inverse_glyph(tilde)
     # 英語フォントにカスタムグリフを適用する
     # - チルダを調整
-    tilde = eng_font[0x007E]
-    tilde.clear()
+    for uni in codepoint_plan.ENG_CUSTOM_GLYPHS:
+        glyph = eng_font[uni]
+        transform_plan.clear_glyph(glyph)
+    transform_plan.flush(eng_font, only_empty=True)
     eng_font.mergeFonts(f"{SOURCE_FONTS_DIR}/inconsolata/custom_glyphs-{eng_style}.sfd")
     eng_font.selection.none()
     # 日本語フォントにカスタムグリフを適用する
     # - ぱぴぷぺぽ パピプペポ の半濁点を調整 20%拡大
-    for uni in [
-        0x3071,
-        0x3074,
-        0x3077,
-        0x307A,
-        0x307D,
-        0x30D1,
-        0x30D4,
-        0x30D7,
-        0x30DA,
-        0x30DD,
-    ]:
+    for uni in codepoint_plan.JP_CUSTOM_GLYPHS:
         glyph = jp_font[uni]
-        glyph.clear()
+        transform_plan.clear_glyph(glyph)
+    transform_plan.flush(jp_font, only_empty=True)
     jp_font.mergeFonts(f"{SOURCE_FONTS_DIR}/biz-ud-gothic/custom_glyphs-{jp_style}.sfd")
 
 
 def scale_glyph(glyph, scale_x, scale_y):
-    """グリフのスケールを調整する"""
+    """グリフのスケールを調整する
+    変換は transform_plan で予約し、スケール後の中心位置は輪郭を書き換えずに求める"""
     original_width = glyph.width
     # スケール前の中心位置を求める
-    before_bb = glyph.boundingBox()
+    before_bb = transform_plan.bounding_box(glyph)
     before_center_x = (before_bb[0] + before_bb[2]) / 2
     before_center_y = (before_bb[1] + before_bb[3]) / 2
     # スケール変換
-    glyph.transform(psMat.scale(scale_x, scale_y))
+    transform_plan.transform(glyph, psMat.scale(scale_x, scale_y))
     # スケール後の中心位置を求める
-    after_bb = glyph.boundingBox()
+    after_bb = transform_plan.bounding_box(glyph)
     after_center_x = (after_bb[0] + after_bb[2]) / 2
     after_center_y = (after_bb[1] + after_bb[3]) / 2
     # 拡大で増えた分を考慮して中心位置を調整
-    glyph.transform(
+    transform_plan.transform(
+        glyph,
         psMat.translate(
             before_center_x - after_center_x,
             before_center_y - after_center_y,
-        )
+        ),
     )
     glyph.width = original_width
 
@@ -373,7 +898,7 @@ def scale_glyph(glyph, scale_x, scale_y):
 def rotate_glyph(glyph, degree):
     """グリフを回転する"""
     # 原点が中央になるように寄せる
-    bb = glyph.boundingBox()
+    bb = transform_plan.bounding_box(glyph)
     center_x = (bb[0] + bb[2]) / 2
     center_y = (bb[1] + bb[3]) / 2
     to_origin = psMat.translate(-center_x, -center_y)
@@ -382,17 +907,17 @@ def rotate_glyph(glyph, degree):
         to_origin,
         psMat.compose(psMat.rotate(radians(degree)), psMat.inverse(to_origin)),
     )
-    glyph.transform(translate_compose)
+    transform_plan.transform(glyph, translate_compose)
 
 
 def inverse_glyph(glyph):
     """グリフを反転する"""
-    before_bb = glyph.boundingBox()
+    before_bb = transform_plan.bounding_box(glyph)
     before_top_y = before_bb[1]
-    glyph.transform(psMat.scale(1, -1))
-    after_bb = glyph.boundingBox()
+    transform_plan.transform(glyph, psMat.scale(1, -1))
+    after_bb = transform_plan.bounding_box(glyph)
     after_top_y = after_bb[1]
-    glyph.transform(psMat.translate(0, before_top_y - after_top_y))
+    transform_plan.transform(glyph, psMat.translate(0, before_top_y - after_top_y))
 
 
 def create_discord(eng_font, jp_font, jp_style):
@@ -403,6 +928,9 @@ def create_discord(eng_font, jp_font, jp_style):
         for char in options.get("discord-ignore-char-list"):
             discord_char_list = discord_char_list.replace(char, "")
 
+    # コピー・ペーストで扱うグリフに予約済みの変換を適用しておく
+    transform_plan.flush(eng_font)
+
     if "0" in discord_char_list:
         eng_font.selection.select("zero.zero")
         eng_font.copy()
@@ -438,7 +966,8 @@ def create_discord(eng_font, jp_font, jp_style):
         for glyph in eng_font.selection.byGlyphs:
             rotate_glyph(glyph, -31)
             # 移動
-            glyph.transform(psMat.translate(20, -560))
+            transform_plan.transform(glyph, psMat.translate(20, -560))
+            transform_plan.flush_glyph(glyph)
         eng_font.copy()
         # Z に編集をかける
         eng_font.selection.select("Z")
@@ -452,6 +981,7 @@ def create_discord(eng_font, jp_font, jp_style):
         eng_font.copy()
         for glyph in eng_font.selection.byGlyphs:
             rotate_glyph(glyph, 180)
+            transform_plan.flush_glyph(glyph)
         eng_font.pasteInto()
         for glyph in eng_font.selection.byGlyphs:
             glyph.intersect()
@@ -469,7 +999,8 @@ def create_discord(eng_font, jp_font, jp_style):
         for glyph in eng_font.selection.byGlyphs:
             rotate_glyph(glyph, -37)
             # 移動
-            glyph.transform(psMat.translate(0, -745))
+            transform_plan.transform(glyph, psMat.translate(0, -745))
+            transform_plan.flush_glyph(glyph)
         eng_font.copy()
         # z に編集をかける
         eng_font.selection.select("z")
@@ -500,7 +1031,7 @@ def create_discord(eng_font, jp_font, jp_style):
         rotate_glyph(glyph, -37)
         scale_glyph(glyph, 1, 1.3)
         rotate_glyph(glyph, 37)
-        glyph.transform(psMat.translate(0, -80))
+        transform_plan.transform(glyph, psMat.translate(0, -80))
     # ハット、アスタリスクを大きくする
     for glyph_name in [0x005E, 0x002A]:
         glyph = eng_font[glyph_name]
@@ -510,28 +1041,10 @@ def create_discord(eng_font, jp_font, jp_style):
     # - ぱぴぷぺぽ パピプペポ の半濁点を調整 30%拡大
     # - カタカナ ヘペベ に特徴付け
     # - カ力 エ工 ロ口 ー一 ニ二 のグリフに特徴付け
-    for uni in [
-        0x3071,
-        0x3074,
-        0x3077,
-        0x307A,
-        0x307D,
-        0x30D1,
-        0x30D4,
-        0x30D7,
-        0x30DA,
-        0x30DD,
-        0x30D8,
-        0x30D9,
-        0x529B,
-        0x5DE5,
-        0x53E3,
-        0x30FC,
-        0x4E00,
-        0x4E8C,
-    ]:
+    for uni in codepoint_plan.DISCORD_CUSTOM_GLYPHS:
         glyph = jp_font[uni]
-        glyph.clear()
+        transform_plan.clear_glyph(glyph)
+    transform_plan.flush(jp_font, only_empty=True)
     jp_font.mergeFonts(
         f"{SOURCE_FONTS_DIR}/biz-ud-gothic/custom_glyphs_discord-{jp_style}.sfd"
     )
@@ -542,40 +1055,47 @@ def adjust_em(font):
     font.em = EM_ASCENT + EM_DESCENT
 
 
-def delete_duplicate_glyphs(jp_font, eng_font):
-    """jp_fontとeng_fontのグリフを比較し、重複するグリフを削除する"""
-
-    eng_font.selection.none()
-    jp_font.selection.none()
-
-    for glyph in jp_font.glyphs("encoding"):
-        try:
-            if glyph.isWorthOutputting() and glyph.unicode > 0:
-                eng_font.selection.select(("more", "unicode"), glyph.unicode)
-        except ValueError:
-            # Encoding is out of range のときは継続する
-            continue
-    for glyph in eng_font.selection.byGlyphs:
-        # if glyph.isWorthOutputting():
-        jp_font.selection.select(("more", "unicode"), glyph.unicode)
-    for glyph in jp_font.selection.byGlyphs:
-        glyph.clear()
-
+def delete_duplicate_glyphs(jp_font, plan):
+    """英語フォントと重複する符号位置のグリフを日本語フォントから削除する"""
+    for glyph in codepoint_plan.select(
+        jp_font, plan["remove"]["jp_duplicate"], plan["present"]["jp"]
+    ).byGlyphs:
+        transform_plan.clear_glyph(glyph)
     jp_font.selection.none()
-    eng_font.selection.none()
 
 
 def shrink_jp_font(jp_font):
-    """日本語フォントを縮小する"""
+    """日本語フォントを縮小する
+    縮小と中心位置への移動を1つの変換に合成して予約する"""
+    scale = psMat.scale(JP_SCALE, JP_SCALE)
+    # 縮小後の幅 (中心位置の計算に使う) は元の幅ごとに求める
+    scaled_widths = {}
     for glyph in jp_font.glyphs():
         if glyph.isWorthOutputting():
             original_width = glyph.width
-            # スケール縮小
-            glyph.transform(psMat.scale(JP_SCALE, JP_SCALE))
-            # 中心位置に移動する
-            glyph.transform(psMat.translate((original_width - glyph.width) / 2, 0))
-            # 幅を元に戻す
-            glyph.width = original_width
+            if original_width not in scaled_widths:
+                scaled_widths[original_width] = transform_plan.transformed_width(
+                    original_width, scale
+                )
+            # スケール縮小し、中心位置に移動する
+            # 幅は元に戻す
+            transform_plan.transform(
+                glyph,
+                psMat.compose(
+                    scale,
+                    psMat.translate(
+                        (original_width - scaled_widths[original_width]) / 2, 0
+                    ),
+                ),
+                width=original_width,
+            )
+
+
+def remove_ccmp_lookups(eng_font):
+    """inconsolata 連続するバッククォートで grave.case が使われるのを防ぐ"""
+    for lookup in eng_font.gsub_lookups:
+        if "ccmp" in lookup:
+            eng_font.removeLookup(lookup)
 
 
 def remove_lookups(font, remove_gsub=True, remove_gpos=True):
@@ -589,100 +1109,36 @@ def remove_lookups(font, remove_gsub=True, remove_gpos=True):
 
 
 def shrink_east_asian_ambiguous_width(jp_font):
-    """East Asian Ambiguous Width のグリフを半角幅に縮小する"""
-    # ref: Unicode East Asian Ambiguous Width: https://www.unicode.org/Public/15.0.0/ucd/EastAsianWidth.txt
-
+    """East Asian Ambiguous Width のグリフを半角幅に縮小する
+    対象のグリフは codepoint_plan.EAW_* で定義する"""
     # 半分に縮小するグリフ
-    for uni in [
-        *range(
-            0x01CD, 0x01DC
-        ),  # LATIN CAPITAL LETTER A WITH CARON..LATIN CAPITAL LETTER U WITH DIAERESIS
-        *range(
-            0x0386, 0x03CF + 1
-        ),  # GREEK CAPITAL LETTER ALPHA WITH TONOS..GREEK SMALL LETTER OMEGA WITH DASIA
-        *range(
-            0x0401, 0x044F + 1
-        ),  # CYRILLIC CAPITAL LETTER IO..CYRILLIC SMALL LETTER YA
-        *range(
-            0x0451, 0x045F + 1
-        ),  # CYRILLIC SMALL LETTER IO..CYRILLIC SMALL LETTER DZHE
-        0x2025,  # TWO DOT LEADER
-        0x203B,  # REFERENCE MARK
-        0x2103,  # DEGREE CELSIUS
-        *range(0x2121, 0x2122 + 1),  # TELEPHONE SIGN..TRADE MARK SIGN
-        0x212B,  # ANGSTROM SIGN
-        *range(0x213A, 0x213B + 1),  # ROTATED CAPITAL Q..FACSIMILE SIGN
-        *range(0x2160, 0x216B + 1),  # ROMAN NUMERAL ONE..ROMAN NUMERAL TWELVE
-        *range(
-            0x2170, 0x217B + 1
-        ),  # SMALL ROMAN NUMERAL ONE..SMALL ROMAN NUMERAL TWELVE
-        0x2200,  # FOR ALL
-        *range(0x2202, 0x2203 + 1),  # PARTIAL DIFFERENTIAL..THERE EXISTS
-        *range(0x2207, 0x2208 + 1),  # NABLA..ELEMENT OF
-        0x220B,  # CONTAINS AS MEMBER
-        *range(0x221F, 0x2220 + 1),  # RIGHT ANGLE..ANGLE
-        *range(0x2225, 0x222C + 1),  # PARALLEL TO..DOUBLE INTEGRAL
-        0x222E,  # CONTOUR INTEGRAL
-        *range(0x2234, 0x2235 + 1),  # THEREFORE..BECAUSE
-        0x2252,  # APPROXIMATELY EQUAL TO OR THE IMAGE OF
-        0x2261,  # IDENTICAL TO
-        *range(
-            0x2266, 0x2267 + 1
-        ),  # LESS-THAN OVER EQUAL TO..GREATER-THAN OVER EQUAL TO
-        *range(0x226A, 0x226B + 1),  # MUCH LESS-THAN..MUCH GREATER-THAN
-        *range(0x2282, 0x2283 + 1),  # SUBSET OF..SUPERSET OF
-        *range(0x2286, 0x2287 + 1),  # SUBSET OF OR EQUAL TO..SUPERSET OF OR EQUAL TO
-        0x22A5,  # UP TACK
-        *range(0x2460, 0x24FF + 1),  # CIRCLED DIGIT ONE..NEGATIVE CIRCLED DIGIT TEN
-        *range(0x25A0, 0x25A1 + 1),  # BLACK SQUARE..WHITE SQUARE
-        *range(
-            0x25B2, 0x25B3 + 1
-        ),  # BLACK UP-POINTING TRIANGLE..WHITE UP-POINTING TRIANGLE
-        *range(
-            0x25BC, 0x25BD + 1
-        ),  # BLACK DOWN-POINTING TRIANGLE..WHITE DOWN-POINTING TRIANGLE
-        0x25CE,  # BULLSEYE
-        0x25EF,  # LARGE CIRCLE
-        *range(0x2605, 0x2606 + 1),  # BLACK STAR..WHITE STAR
-        0x260E,  # BLACK TELEPHONE
-        0x2640,  # FEMALE SIGN
-        0x2642,  # MALE SIGN
-        *range(0x2668, 0x266F + 1),  # HOT SPRINGS..MUSIC SHARP SIGN
-        0x2756,  # BLACK DIAMOND MINUS WHITE X
-        *range(
-            0x2776, 0x277F + 1
-        ),  # DINGBAT NEGATIVE CIRCLED DIGIT ONE..DINGBAT NEGATIVE CIRCLED NUMBER TEN
-        0x27A1,  # BLACK RIGHTWARDS ARROW
-        0x29BF,  # CIRCLED BULLET
-        0x1F100,  # DIGIT ZERO FULL STOP
-    ]:
+    for uni in sorted(codepoint_plan.expand_ranges(codepoint_plan.EAW_SHRINK)):
         try:
             glyph = jp_font[uni]
             if glyph.isWorthOutputting() and glyph.width == HALF_WIDTH_12 * 2:
                 before_width = glyph.width
                 scale_glyph(glyph, 0.6, 1)
-                glyph.transform(psMat.translate((HALF_WIDTH_12 - before_width) / 2, 0))
+                transform_plan.transform(
+                    glyph, psMat.translate((HALF_WIDTH_12 - before_width) / 2, 0)
+                )
                 glyph.width = HALF_WIDTH_12
         except Exception:
             continue
 
     # 半分の幅にしても収まるために幅を半分に位置調整だけするグリフ
-    for uni in [0x2016]:  # DOUBLE VERTICAL LINE
+    for uni in sorted(codepoint_plan.expand_ranges(codepoint_plan.EAW_MOVE)):
         try:
             glyph = jp_font[uni]
             if glyph.isWorthOutputting() and glyph.width == HALF_WIDTH_12 * 2:
-                glyph.transform(psMat.translate((HALF_WIDTH_12 - glyph.width) / 2, 0))
+                transform_plan.transform(
+                    glyph, psMat.translate((HALF_WIDTH_12 - glyph.width) / 2, 0)
+                )
                 glyph.width = HALF_WIDTH_12
         except Exception:
             continue
 
     # 文字が潰れて見えなくなってしまうため、縮小なし、位置移動なしで幅だけ半角にするグリフ
-    for uni in [
-        *range(0x2600, 0x2603 + 1),  # BLACK SUN WITH RAYS..SNOWMAN
-        *range(
-            0x261C, 0x261F + 1
-        ),  # WHITE LEFT POINTING INDEX..WHITE DOWN POINTING INDEX
-    ]:
+    for uni in sorted(codepoint_plan.expand_ranges(codepoint_plan.EAW_WIDTH_ONLY)):
         try:
             glyph = jp_font[uni]
             if glyph.isWorthOutputting() and glyph.width == HALF_WIDTH_12 * 2:
@@ -691,97 +1147,26 @@ def shrink_east_asian_ambiguous_width(jp_font):
             continue
 
     # 半分の幅にしつつ、潰れないように縦には広げるグリフ
-    for uni in [
-        0x21D2,  # RIGHTWARDS DOUBLE ARROW
-        0x21D4,  # LEFT RIGHT DOUBLE ARROW
-        0x221D,  # PROPORTIONAL TO
-        0x223D,  # REVERSED TILDE
-    ]:
+    for uni in sorted(codepoint_plan.expand_ranges(codepoint_plan.EAW_SHRINK_TALL)):
         try:
             glyph = jp_font[uni]
             if glyph.isWorthOutputting() and glyph.width == HALF_WIDTH_12 * 2:
                 before_width = glyph.width
                 scale_glyph(glyph, 0.6, 1.25)
-                glyph.transform(psMat.translate((HALF_WIDTH_12 - before_width) / 2, 0))
+                transform_plan.transform(
+                    glyph, psMat.translate((HALF_WIDTH_12 - before_width) / 2, 0)
+                )
                 glyph.width = HALF_WIDTH_12
         except Exception:
             continue
 
 
-def remove_jpdoc_symbols(eng_font):
-    """日本語文書に頻出する記号を削除する"""
-    eng_font.selection.none()
-    # § (U+00A7)
-    eng_font.selection.select(("more", "unicode"), 0x00A7)
-    # ± (U+00B1)
-    eng_font.selection.select(("more", "unicode"), 0x00B1)
-    # ¶ (U+00B6)
-    eng_font.selection.select(("more", "unicode"), 0x00B6)
-    # ÷ (U+00F7)
-    eng_font.selection.select(("more", "unicode"), 0x00F7)
-    # × (U+00D7)
-    eng_font.selection.select(("more", "unicode"), 0x00D7)
-    # ⇒ (U+21D2)
-    eng_font.selection.select(("more", "unicode"), 0x21D2)
-    # ⇔ (U+21D4)
-    eng_font.selection.select(("more", "unicode"), 0x21D4)
-    # ■-□ (U+25A0-U+25A1)
-    eng_font.selection.select(("more", "ranges"), 0x25A0, 0x25A1)
-    # ▲-△ (U+25B2-U+25B3)
-    eng_font.selection.select(("more", "ranges"), 0x25A0, 0x25B3)
-    # ▼-▽ (U+25BC-U+25BD)
-    eng_font.selection.select(("more", "ranges"), 0x25BC, 0x25BD)
-    # ◆-◇ (U+25C6-U+25C7)
-    eng_font.selection.select(("more", "ranges"), 0x25C6, 0x25C7)
-    # ○ (U+25CB)
-    eng_font.selection.select(("more", "unicode"), 0x25CB)
-    # ◎-● (U+25CE-U+25CF)
-    eng_font.selection.select(("more", "ranges"), 0x25CE, 0x25CF)
-    # ◥ (U+25E5)
-    eng_font.selection.select(("more", "unicode"), 0x25E5)
-    # ◯ (U+25EF)
-    eng_font.selection.select(("more", "unicode"), 0x25EF)
-    # √ (U+221A)
-    eng_font.selection.select(("more", "unicode"), 0x221A)
-    # ∞ (U+221E)
-    eng_font.selection.select(("more", "unicode"), 0x221E)
-    # ‐ (U+2010)
-    eng_font.selection.select(("more", "unicode"), 0x2010)
-    # ‘-‚ (U+2018-U+201A)
-    eng_font.selection.select(("more", "ranges"), 0x2018, 0x201A)
-    # “-„ (U+201C-U+201E)
-    eng_font.selection.select(("more", "ranges"), 0x201C, 0x201E)
-    # †-‡ (U+2020-U+2021)
-    eng_font.selection.select(("more", "ranges"), 0x2020, 0x2021)
-    # … (U+2026)
-    eng_font.selection.select(("more", "unicode"), 0x2026)
-    # ‰ (U+2030)
-    eng_font.selection.select(("more", "unicode"), 0x2030)
-    # ←-↓ (U+2190-U+2193)
-    eng_font.selection.select(("more", "ranges"), 0x2190, 0x2193)
-    # ∀ (U+2200)
-    eng_font.selection.select(("more", "unicode"), 0x2200)
-    # ∂-∃ (U+2202-U+2203)
-    eng_font.selection.select(("more", "ranges"), 0x2202, 0x2203)
-    # ∈ (U+2208)
-    eng_font.selection.select(("more", "unicode"), 0x2208)
-    # ∋ (U+220B)
-    eng_font.selection.select(("more", "unicode"), 0x220B)
-    # ∑ (U+2211)
-    eng_font.selection.select(("more", "unicode"), 0x2211)
-    # ∥ (U+2225)
-    eng_font.selection.select(("more", "unicode"), 0x2225)
-    # ∧-∬ (U+2227-U+222C)
-    eng_font.selection.select(("more", "ranges"), 0x2227, 0x222C)
-    # ≠-≡ (U+2260-U+2261)
-    eng_font.selection.select(("more", "ranges"), 0x2260, 0x2261)
-    # ⊂-⊃ (U+2282-U+2283)
-    eng_font.selection.select(("more", "ranges"), 0x2282, 0x2283)
-    # ⊆-⊇ (U+2286-U+2287)
-    eng_font.selection.select(("more", "ranges"), 0x2286, 0x2287)
-    # ─-╿ (Box Drawing) (U+2500-U+257F)
-    eng_font.selection.select(("more", "ranges"), 0x2500, 0x257F)
-    for glyph in eng_font.selection.byGlyphs:
+def remove_jpdoc_symbols(eng_font, plan):
+    """日本語文書に頻出する記号を削除する
+    対象の記号は codepoint_plan.JPDOC_SYMBOLS で定義する"""
+    for glyph in codepoint_plan.select(
+        eng_font, plan["remove"]["eng_jpdoc"], plan["present"]["eng"]
+    ).byGlyphs:
         if glyph.isWorthOutputting():
             glyph.clear()
     eng_font.selection.none()
@@ -792,13 +1177,14 @@ def visualize_zenkaku_space(jp_font):
     # 全角スペースを差し替え
     glyph = jp_font[0x3000]
     width_to = glyph.width
-    glyph.clear()
+    transform_plan.clear_glyph(glyph)
+    transform_plan.flush(jp_font, only_empty=True)
     jp_font.mergeFonts(fontforge.open(f"{SOURCE_FONTS_DIR}/{IDEOGRAPHIC_SPACE}"))
     # 幅を設定し位置調整
     jp_font.selection.select("U+3000")
     for glyph in jp_font.selection.byGlyphs:
         width_from = glyph.width
-        glyph.transform(psMat.translate((width_to - width_from) / 2, 0))
+        transform_plan.transform(glyph, psMat.translate((width_to - width_from) / 2, 0))
         glyph.width = width_to
     jp_font.selection.none()
 
@@ -844,74 +1230,97 @@ def add_box_drawing_block_elements(jp_font, eng_font):
     jp_font.mergeFonts(hack_font)
 
 
-def add_nerd_font_glyphs(jp_font, eng_font):
+def open_nerd_font(half_width):
+    """EM と半角幅を合わせた Nerd Font を開く
+    調整済みのフォントはソースフォントと半角幅のみで決まるため、キャッシュがあればそれを開く"""
+    nerd_font_path = f"{SOURCE_FONTS_DIR}/SymbolsNerdFont-Regular.ttf"
+
+    cache_key = None
+    if not options.get("no-cache"):
+        cache_key = build_cache.make_key(
+            build_cache.file_hash(nerd_font_path),
+            EM_ASCENT + EM_DESCENT,
+            half_width,
+            build_cache.source_hash(open_nerd_font),
+            fontforge.version(),
+        )
+        cached_font_path = build_cache.get("nerd_font", cache_key, "nerd_font.ttf")
+        if cached_font_path:
+            print(f"use nerd font cache {cache_key}")
+            return fontforge.open(cached_font_path)
+
+    font = fontforge.open(nerd_font_path)
+    font.em = EM_ASCENT + EM_DESCENT
+    glyph_names = set()
+    for nerd_glyph in font.glyphs():
+        # Nerd Fontsのグリフ名をユニークにするため接尾辞を付ける
+        nerd_glyph.glyphname = f"{nerd_glyph.glyphname}-nf"
+        # postテーブルでのグリフ名重複対策
+        # fonttools merge で合成した後、MacOSで `'post'テーブルの使用性` エラーが発生することへの対処
+        if nerd_glyph.glyphname in glyph_names:
+            nerd_glyph.glyphname = f"{nerd_glyph.glyphname}-{nerd_glyph.encoding}"
+        glyph_names.add(nerd_glyph.glyphname)
+        # Powerline Symbols の調整
+        if 0xE0B0 <= nerd_glyph.unicode <= 0xE0D4:
+            # なぜかズレている右付きグリフの個別調整 (EM 1000 に変更した後を想定して調整)
+            original_width = nerd_glyph.width
+            if nerd_glyph.unicode == 0xE0B2:
+                nerd_glyph.transform(psMat.translate(-353 * 2.024, 0))
+            elif nerd_glyph.unicode == 0xE0B6:
+                nerd_glyph.transform(psMat.translate(-414 * 2.024, 0))
+            elif nerd_glyph.unicode == 0xE0C5:
+                nerd_glyph.transform(psMat.translate(-137 * 2.024, 0))
+            elif nerd_glyph.unicode == 0xE0C7:
+                nerd_glyph.transform(psMat.translate(-214 * 2.024, 0))
+            elif nerd_glyph.unicode == 0xE0D4:
+                nerd_glyph.transform(psMat.translate(-314 * 2.024, 0))
+            nerd_glyph.width = original_width
+            # 位置と幅合わせ
+            if nerd_glyph.width < half_width:
+                nerd_glyph.transform(
+                    psMat.translate((half_width - nerd_glyph.width) / 2, 0)
+                )
+            elif nerd_glyph.width > half_width:
+                nerd_glyph.transform(psMat.scale(half_width / nerd_glyph.width, 1))
+            # グリフの高さ・位置を調整する
+            # nerd_glyph.transform(psMat.scale(1, 1.02))
+            nerd_glyph.transform(psMat.translate(0, 33))
+        elif nerd_glyph.width < (EM_ASCENT + EM_DESCENT) * 0.6:
+            # 幅が狭いグリフは中央寄せとみなして調整する
+            nerd_glyph.transform(
+                psMat.translate((half_width - nerd_glyph.width) / 2, 0)
+            )
+        # 幅を設定
+        nerd_glyph.width = half_width
+
+    if cache_key is None:
+        return font
+    # 調整済みのフォントをキャッシュに格納して開き直す
+    font_path = f"{BUILD_FONTS_DIR}/nerd_font_{uuid.uuid4()}.ttf"
+    font.generate(font_path)
+    font.close()
+    font_path = build_cache.put(
+        "nerd_font", cache_key, "nerd_font.ttf", font_path, move=True
+    )
+    return fontforge.open(font_path)
+
+
+def add_nerd_font_glyphs(jp_font, eng_font, plan):
     """Nerd Fontのグリフを追加する"""
     global nerd_font
     # Nerd Fontのグリフを追加する
     if nerd_font is None:
-        nerd_font = fontforge.open(f"{SOURCE_FONTS_DIR}/SymbolsNerdFont-Regular.ttf")
-        nerd_font.em = EM_ASCENT + EM_DESCENT
-        glyph_names = set()
-        for nerd_glyph in nerd_font.glyphs():
-            # Nerd Fontsのグリフ名をユニークにするため接尾辞を付ける
-            nerd_glyph.glyphname = f"{nerd_glyph.glyphname}-nf"
-            # postテーブルでのグリフ名重複対策
-            # fonttools merge で合成した後、MacOSで `'post'テーブルの使用性` エラーが発生することへの対処
-            if nerd_glyph.glyphname in glyph_names:
-                nerd_glyph.glyphname = f"{nerd_glyph.glyphname}-{nerd_glyph.encoding}"
-            glyph_names.add(nerd_glyph.glyphname)
-            # 幅を調整する
-            half_width = eng_font[0x0030].width
-            # Powerline Symbols の調整
-            if 0xE0B0 <= nerd_glyph.unicode <= 0xE0D4:
-                # なぜかズレている右付きグリフの個別調整 (EM 1000 に変更した後を想定して調整)
-                original_width = nerd_glyph.width
-                if nerd_glyph.unicode == 0xE0B2:
-                    nerd_glyph.transform(psMat.translate(-353 * 2.024, 0))
-                elif nerd_glyph.unicode == 0xE0B6:
-                    nerd_glyph.transform(psMat.translate(-414 * 2.024, 0))
-                elif nerd_glyph.unicode == 0xE0C5:
-                    nerd_glyph.transform(psMat.translate(-137 * 2.024, 0))
-                elif nerd_glyph.unicode == 0xE0C7:
-                    nerd_glyph.transform(psMat.translate(-214 * 2.024, 0))
-                elif nerd_glyph.unicode == 0xE0D4:
-                    nerd_glyph.transform(psMat.translate(-314 * 2.024, 0))
-                nerd_glyph.width = original_width
-                # 位置と幅合わせ
-                if nerd_glyph.width < half_width:
-                    nerd_glyph.transform(
-                        psMat.translate((half_width - nerd_glyph.width) / 2, 0)
-                    )
-                elif nerd_glyph.width > half_width:
-                    nerd_glyph.transform(psMat.scale(half_width / nerd_glyph.width, 1))
-                # グリフの高さ・位置を調整する
-                # nerd_glyph.transform(psMat.scale(1, 1.02))
-                nerd_glyph.transform(psMat.translate(0, 33))
-            elif nerd_glyph.width < (EM_ASCENT + EM_DESCENT) * 0.6:
-                # 幅が狭いグリフは中央寄せとみなして調整する
-                nerd_glyph.transform(
-                    psMat.translate((half_width - nerd_glyph.width) / 2, 0)
-                )
-            # 幅を設定
-            nerd_glyph.width = half_width
+        nerd_font = open_nerd_font(eng_font[0x0030].width)
     # 日本語フォントにマージするため、既に存在する場合は削除する
-    for nerd_glyph in nerd_font.glyphs():
-        if nerd_glyph.unicode != -1:
-            # 既に存在する場合は削除する
-            try:
-                for glyph in jp_font.selection.select(
-                    ("unicode", None), nerd_glyph.unicode
-                ).byGlyphs:
-                    glyph.clear()
-            except Exception:
-                pass
-            try:
-                for glyph in eng_font.selection.select(
-                    ("unicode", None), nerd_glyph.unicode
-                ).byGlyphs:
-                    glyph.clear()
-            except Exception:
-                pass
+    for glyph in codepoint_plan.select(
+        jp_font, plan["remove"]["jp_nerd"], plan["present"]["jp"]
+    ).byGlyphs:
+        transform_plan.clear_glyph(glyph)
+    for glyph in codepoint_plan.select(
+        eng_font, plan["remove"]["eng_nerd"], plan["present"]["eng"]
+    ).byGlyphs:
+        transform_plan.clear_glyph(glyph)
+    transform_plan.flush(jp_font, only_empty=True)
     jp_font.mergeFonts(nerd_font)
     jp_font.selection.none()
     eng_font.selection.none()
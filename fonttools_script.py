@@ -2,13 +2,24 @@
 
 import configparser
 import glob
+import json
 import os
+import struct
 import sys
-import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
 from pathlib import Path
 
-from fontTools import merge, ttLib, ttx
-from ttfautohint import options, ttfautohint
+import numpy as np
+import ttfautohint as ttfautohint_package
+from fontTools import merge, subset, ttLib, unicodedata
+from fontTools.ttLib import woff2
+from fontTools.ttLib.tables import ttProgram
+from ttfautohint import libttfautohint, ttfautohint
+from ttfautohint.options import parse_args
+
+import build_cache
+import build_report
 
 # iniファイルを読み込む
 settings = configparser.ConfigParser()
@@ -16,19 +27,70 @@ settings.read("build.ini", encoding="utf-8")
 
 FONT_NAME = settings.get("DEFAULT", "FONT_NAME")
 FONTFORGE_PREFIX = settings.get("DEFAULT", "FONTFORGE_PREFIX")
-FONTTOOLS_PREFIX = settings.get("DEFAULT", "FONTTOOLS_PREFIX")
 BUILD_FONTS_DIR = settings.get("DEFAULT", "BUILD_FONTS_DIR")
 HALF_WIDTH_12 = int(settings.get("DEFAULT", "HALF_WIDTH_12"))
 FULL_WIDTH_35 = int(settings.get("DEFAULT", "FULL_WIDTH_35"))
 WIDTH_35_STR = settings.get("DEFAULT", "WIDTH_35_STR")
+NERD_FONTS_STR = settings.get("DEFAULT", "NERD_FONTS_STR")
+# 完成したフォントのサイズの上限 (KB)。0 の場合は確認しない
+SIZE_BUDGET_KB = int(settings.get("DEFAULT", "SIZE_BUDGET_KB"))
+SIZE_BUDGET_NF_KB = int(settings.get("DEFAULT", "SIZE_BUDGET_NF_KB"))
+
+
+options = {}
 
 
 def main():
-    # 第一引数を取得
-    # 特定のバリエーションのみを処理するための指定
-    specific_variant = sys.argv[1] if len(sys.argv) > 1 else None
+    # オプション判定
+    get_options()
+    if options.get("unknown-option"):
+        usage()
+        return
+
+    edit_fonts(options.get("variant"))
 
-    edit_fonts(specific_variant)
+
+def usage():
+    print(
+        f"Usage: {sys.argv[0]} "
+        "[VARIANT-STYLE] [--jobs=N] [--no-cache] [--profile] [--woff2] "
+        "[--size-budget=KB] [--no-glyph-names]"
+    )
+
+
+def get_options():
+    """オプションを取得する"""
+
+    global options
+
+    for arg in sys.argv[1:]:
+        # オプション判定
+        if arg.startswith("--jobs="):
+            # フォントを並列に編集するプロセス数
+            options["jobs"] = int(arg.split("=")[1])
+        elif arg == "--no-cache":
+            options["no-cache"] = True
+        elif arg == "--profile":
+            # 処理段階ごとに cProfile の結果を出力する
+            options["profile"] = True
+        elif arg == "--woff2":
+            # 完成したフォントと同じ場所に WOFF2 ファイルも出力する
+            options["woff2"] = True
+        elif arg == "--no-glyph-names":
+            # post テーブルを format 3 (グリフ名なし) で出力する
+            options["no-glyph-names"] = True
+        elif arg.startswith("--size-budget="):
+            # 完成したフォントのサイズの上限 (KB)。build.ini の SIZE_BUDGET_KB より優先する
+            options["size-budget"] = int(arg.split("=")[1])
+        elif arg.startswith("--"):
+            options["unknown-option"] = True
+            return
+        elif "variant" not in options:
+            # 特定のバリエーションのみを処理するための指定 (例: NF-Regular, -Bold)
+            options["variant"] = arg
+        else:
+            options["unknown-option"] = True
+            return
 
 
 def edit_fonts(specific_variant: str):
@@ -45,28 +107,71 @@ def edit_fonts(specific_variant: str):
         print(f"Error: {file_pattern} not found")
         return
     paths = [Path(f) for f in filenames]
-    for path in paths:
-        print(f"edit {str(path)}")
-        style = path.stem.split("-")[1]
-        variant = path.stem.split("-")[0].replace(f"{FONTFORGE_PREFIX}{FONT_NAME}", "")
-        add_hinting(str(path), str(path).replace(".ttf", "-hinted.ttf"))
-        merge_fonts(style, variant)
-        fix_font_tables(style, variant)
-
-    # 一時ファイルを削除
-    # スタイル部分以降はワイルドカードで指定
-    for filename in glob.glob(
-        f"{BUILD_FONTS_DIR}/{FONTTOOLS_PREFIX}{FONT_NAME}{specific_variant}*"
-    ):
-        os.remove(filename)
-    for filename in glob.glob(
-        f"{BUILD_FONTS_DIR}/{FONTFORGE_PREFIX}{FONT_NAME}{specific_variant}*"
-    ):
-        os.remove(filename)
-
-
-def add_hinting(input_font_path, output_font_path):
-    """フォントにヒンティングを付ける"""
+
+    # (バリアント, スタイル) ごとに別プロセスで編集する
+    jobs = min(options.get("jobs", os.cpu_count() or 1), len(paths))
+    if jobs <= 1:
+        for path in paths:
+            edit_font(path, options)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(edit_font, path, options) for path in paths]
+        for future in futures:
+            future.result()
+
+
+def edit_font(path: Path, options_):
+    """1つの (バリアント, スタイル) のフォントを編集する (ワーカープロセスからも呼ばれる)
+    spawn で起動されたプロセスではオプションが引き継がれないため、引数で受け取る"""
+    print(f"edit {str(path)}")
+    style = path.stem.split("-")[1]
+    variant = path.stem.split("-")[0].replace(f"{FONTFORGE_PREFIX}{FONT_NAME}", "")
+
+    # 処理段階ごとの実行時間とメモリ使用量を記録する
+    report = build_report.BuildReport(
+        "fonttools",
+        f"{FONT_NAME.replace(' ', '')}{variant}-{style}",
+        profile=options_.get("profile"),
+    )
+    # 中間ファイルは書き出さず、バイト列と TTFont オブジェクトのまま受け渡す
+    with report.stage("add_hinting"):
+        hinted_eng_font = add_hinting(str(path), use_cache=not options_.get("no-cache"))
+    with report.stage("open_jp_font"):
+        jp_font = open_jp_font(style, variant)
+    with report.stage("merge_fonts"):
+        merged_font = merge_fonts(jp_font, hinted_eng_font)
+    with report.stage("remove_unused_glyphs"):
+        remove_unused_glyphs(merged_font, style, variant)
+    with report.stage("fix_font_tables"):
+        font_path = fix_font_tables(
+            merged_font,
+            style,
+            variant,
+            glyph_names=not options_.get("no-glyph-names"),
+        )
+    with report.stage("size_report"):
+        size_report = get_size_report(font_path)
+        print_size_report(font_path, size_report)
+        report.record("size", size_report)
+    # WOFF2 の圧縮も (バリアント, スタイル) ごとのワーカープロセス内で並列に行う
+    if options_.get("woff2"):
+        with report.stage("woff2"):
+            compress_woff2(font_path)
+    report.save()
+    check_size_budget(font_path, size_report, get_size_budget(variant, options_))
+
+    # このジョブの一時ファイルのみを削除する
+    for suffix in ("eng.ttf", "jp.ttf", "jp-transforms.json"):
+        filename = (
+            f"{BUILD_FONTS_DIR}/{FONTFORGE_PREFIX}{FONT_NAME}{variant}-{style}-{suffix}"
+        )
+        if os.path.exists(filename):
+            os.remove(filename)
+
+
+def add_hinting(input_font_path, use_cache=True) -> bytes:
+    """フォントにヒンティングを付け、ヒンティング済みフォントのバイト列を返す
+    入力フォントの内容、ttfautohint のバージョン、引数が同じ場合はキャッシュを使う"""
     args = [
         "-l",
         "6",
@@ -81,136 +186,268 @@ def add_hinting(input_font_path, output_font_path):
         # "-X",
         # "16-",
         "-I",
-        input_font_path,
-        output_font_path,
     ]
-    options_ = options.parse_args(args)
-    print("exec hinting", options_)
-    ttfautohint(**options_)
-
-
-def merge_fonts(style, variant):
-    """フォントを結合する"""
-    eng_font_path = f"{BUILD_FONTS_DIR}/{FONTFORGE_PREFIX}{FONT_NAME}{variant}-{style}-eng-hinted.ttf"
+    with open(input_font_path, "rb") as f:
+        input_font = f.read()
+
+    cache_key = build_cache.make_key(
+        build_cache.bytes_hash(input_font),
+        ttfautohint_package.__version__,
+        libttfautohint.version_string,
+        args,
+    )
+    if use_cache:
+        cached_path = build_cache.get("ttfautohint", cache_key, "hinted.ttf")
+        if cached_path is not None:
+            print("use cache", input_font_path)
+            with open(cached_path, "rb") as f:
+                return f.read()
+
+    options_ = parse_args(args)
+    # 入出力ともにファイルではなくメモリ上のバッファを使う
+    options_["in_buffer"] = input_font
+    options_["in_file"] = None
+    options_["out_file"] = None
+    print("exec hinting", input_font_path)
+    hinted_font = ttfautohint(**options_)
+
+    if use_cache:
+        build_cache.put_bytes("ttfautohint", cache_key, "hinted.ttf", hinted_font)
+    return hinted_font
+
+
+def open_jp_font(style, variant) -> ttLib.TTFont:
+    """結合する日本語フォントを開く"""
     jp_font_path = (
         f"{BUILD_FONTS_DIR}/{FONTFORGE_PREFIX}{FONT_NAME}{variant}-{style}-jp.ttf"
     )
-    # vhea, vmtxテーブルを削除
     jp_font_object = ttLib.TTFont(jp_font_path)
+    # vhea, vmtxテーブルを削除
     if "vhea" in jp_font_object:
         del jp_font_object["vhea"]
     if "vmtx" in jp_font_object:
         del jp_font_object["vmtx"]
-    jp_font_object.save(jp_font_path)
+
+    # fontforge_script.py --jp-scale-backend=fonttools で出力された変換を適用する
+    transforms_path = jp_font_path.replace(".ttf", "-transforms.json")
+    if os.path.exists(transforms_path):
+        with open(transforms_path, encoding="utf-8") as f:
+            transform_glyphs(jp_font_object, json.load(f))
+        # バウンディングボックスは transform_glyphs で求めたものを使う
+        jp_font_object.recalcBBoxes = False
+    return jp_font_object
+
+
+def transform_glyphs(font: ttLib.TTFont, transforms: dict):
+    """{グリフ名: 変換行列} の変換を glyf テーブルに適用する
+    同じ変換行列のグリフの座標をまとめて NumPy で変換し、バウンディングボックスも一括で求める"""
+    glyf = font["glyf"]
+    hmtx = font["hmtx"]
+
+    # 変換行列ごとにグリフをまとめる
+    glyph_names_by_matrix = {}
+    for glyph_name, matrix in transforms.items():
+        glyph_names_by_matrix.setdefault(tuple(matrix), []).append(glyph_name)
+
+    for (a, b, c, d, e, f), glyph_names in glyph_names_by_matrix.items():
+        glyphs = [(name, glyf[name]) for name in glyph_names]
+        glyphs = [(name, glyph) for name, glyph in glyphs if glyph.numberOfContours > 0]
+        if len(glyphs) == 0:
+            continue
+        # GlyphCoordinates の配列をコピーせずに参照する
+        views = [
+            np.frombuffer(glyph.coordinates.array, dtype=np.float64).reshape(-1, 2)
+            for _, glyph in glyphs
+        ]
+        starts = np.cumsum([0] + [len(view) for view in views])
+        points = np.concatenate(views)
+        x = points[:, 0]
+        y = points[:, 1]
+        transformed = np.empty_like(points)
+        transformed[:, 0] = a * x + c * y + e
+        transformed[:, 1] = b * x + d * y + f
+        # FontForge が ttf を出力するときと同様に、最も近い整数 (0.5 は偶数側) に丸める
+        transformed = np.rint(transformed)
+
+        x_mins = np.minimum.reduceat(transformed[:, 0], starts[:-1])
+        y_mins = np.minimum.reduceat(transformed[:, 1], starts[:-1])
+        x_maxs = np.maximum.reduceat(transformed[:, 0], starts[:-1])
+        y_maxs = np.maximum.reduceat(transformed[:, 1], starts[:-1])
+        for i, (name, glyph) in enumerate(glyphs):
+            views[i][:] = transformed[starts[i] : starts[i + 1]]
+            glyph.xMin = int(x_mins[i])
+            glyph.yMin = int(y_mins[i])
+            glyph.xMax = int(x_maxs[i])
+            glyph.yMax = int(y_maxs[i])
+            # 変換前の輪郭に対する命令は使えないため削除する
+            if hasattr(glyph, "program"):
+                glyph.program = ttProgram.Program()
+                glyph.program.fromBytecode([])
+            # 幅は FontForge で設定済みのため、左サイドベアリングのみ更新する
+            hmtx[name] = (hmtx[name][0], glyph.xMin)
+
+
+def merge_fonts(jp_font: ttLib.TTFont, hinted_eng_font: bytes) -> ttLib.TTFont:
+    """フォントを結合する"""
+    # 読み込んでいないテーブル (glyf など) は元のバイナリのままバッファへ書き出される
+    jp_font_buffer = BytesIO()
+    jp_font.save(jp_font_buffer)
+    jp_font.close()
     # フォントを結合
     merger = merge.Merger()
-    merged_font = merger.merge([eng_font_path, jp_font_path])
-    merged_font.save(
-        f"{BUILD_FONTS_DIR}/{FONTTOOLS_PREFIX}{FONT_NAME}{variant}-{style}_merged.ttf"
+    return merger.merge([BytesIO(hinted_eng_font), jp_font_buffer])
+
+
+def remove_unused_glyphs(font: ttLib.TTFont, style, variant):
+    """結合したフォントから使われないグリフを削除する
+    cmap と異体字シーケンスから参照されるグリフと、それらから GSUB や複合グリフで参照されるグリフのみを残す。
+    FontForge で消去しただけのグリフや、ccmp の削除で参照されなくなったグリフなどが削除される"""
+    # 異体字シーケンスは fix_cmap_table で日本語フォントから移すため、そのグリフを残す
+    uvs_glyph_names = get_uvs_glyph_names(style, variant)
+    copies = dedupe_glyph_copies(font, uvs_glyph_names)
+
+    num_glyphs = len(font.getGlyphOrder())
+    subsetter = subset.Subsetter(get_subset_options())
+    subsetter.populate(
+        glyphs=uvs_glyph_names & set(font.getGlyphOrder()),
+        unicodes=font.getBestCmap().keys(),
+    )
+    subsetter.subset(font)
+
+    # GSUB や複合グリフから参照されていて残ったコピーは、元の符号位置に戻す
+    kept_glyph_names = set(font.getGlyphOrder())
+    restored = {
+        code: glyph_name
+        for code, glyph_name in copies.items()
+        if glyph_name in kept_glyph_names
+    }
+    remap_cmap(font, restored)
+    print(
+        f"remove unused glyphs: glyphs {num_glyphs} -> {len(font.getGlyphOrder())} "
+        f"(glyph copies {len(copies) - len(restored)})"
     )
 
 
-def fix_font_tables(style, variant):
-    """フォントテーブルを編集する"""
+def dedupe_glyph_copies(font: ttLib.TTFont, uvs_glyph_names: set) -> dict:
+    """fontforge_script.py の altuni_to_entity で作成したグリフのコピー (uniXXXXcopy) のうち、
+    コピー元と glyf のバイト列・hmtx が同じものを参照する符号位置を、コピー元のグリフに付け替える。
+    付け替えた {符号位置: コピーのグリフ名} を返す。参照されなくなったコピーは remove_unused_glyphs で削除される。
+    結合 (merge_fonts) の後に行うため、altuni_to_entity による結合時の対策はそのまま効く"""
+    glyf = font["glyf"]
+    hmtx = font["hmtx"]
+
+    # cmap から参照されるコピー以外のグリフを、内容から引けるようにする
+    glyph_by_content = {}
+    copies = {}
+    for code, glyph_name in sorted(font.getBestCmap().items()):
+        content = (glyf[glyph_name].compile(glyf, recalcBBoxes=False), hmtx[glyph_name])
+        if glyph_name.endswith("copy"):
+            if glyph_name not in uvs_glyph_names:
+                copies[code] = (glyph_name, content)
+        else:
+            glyph_by_content.setdefault(content, glyph_name)
+    remap = {
+        code: glyph_by_content[content]
+        for code, (_, content) in copies.items()
+        if content in glyph_by_content
+    }
+    remap_cmap(font, remap)
+    return {code: copies[code][0] for code in remap}
+
+
+def remap_cmap(font: ttLib.TTFont, mapping: dict):
+    """cmap の (異体字シーケンス以外の) サブテーブルで、符号位置が参照するグリフを付け替える"""
+    for table in font["cmap"].tables:
+        if table.format == 14:
+            continue
+        for code, glyph_name in mapping.items():
+            if code in table.cmap:
+                table.cmap[code] = glyph_name
+
+
+def get_uvs_glyph_names(style, variant) -> set:
+    """日本語フォントの異体字シーケンス (cmap format 14) から参照されるグリフ名を返す"""
+    source_font = ttLib.TTFont(
+        f"{BUILD_FONTS_DIR}/{FONTFORGE_PREFIX}{FONT_NAME}{variant}-{style}-jp.ttf",
+        lazy=True,
+    )
+    glyph_names = {
+        glyph_name
+        for table in source_font["cmap"].tables
+        if table.format == 14
+        for mappings in table.uvsDict.values()
+        for _, glyph_name in mappings
+        if glyph_name is not None
+    }
+    source_font.close()
+    return glyph_names
+
+
+def get_subset_options():
+    """グリフの削除以外はフォントをそのまま残す subsetter のオプションを返す"""
+    subset_options = subset.Options()
+    # GSUB, GPOS の全機能と、それらから参照されるグリフを残す
+    subset_options.layout_features = ["*"]
+    subset_options.layout_scripts = ["*"]
+    # テーブル・名前・グリフ名・ヒンティング・cmap のサブテーブルはそのまま残す
+    subset_options.drop_tables = []
+    subset_options.passthrough_tables = True
+    subset_options.name_IDs = ["*"]
+    subset_options.name_languages = ["*"]
+    subset_options.name_legacy = True
+    subset_options.legacy_kern = True
+    subset_options.glyph_names = True
+    subset_options.legacy_cmap = True
+    subset_options.symbol_cmap = True
+    subset_options.notdef_outline = True
+    subset_options.prune_unicode_ranges = False
+    return subset_options
+
+
+def fix_font_tables(font: ttLib.TTFont, style, variant, glyph_names=True) -> str:
+    """結合済みフォントのテーブルを編集し、完成したフォントを保存する
+    保存したフォントのパスを返す"""
 
-    input_font_name = f"{FONTTOOLS_PREFIX}{FONT_NAME}{variant}-{style}_merged.ttf"
-    output_name_base = f"{FONTTOOLS_PREFIX}{FONT_NAME}{variant}-{style}"
     completed_name_base = f"{FONT_NAME.replace(' ', '')}{variant}-{style}"
 
-    # OS/2, post テーブルのみのttxファイルを出力
-    xml = dump_ttx(input_font_name, output_name_base)
     # OS/2 テーブルを編集
-    fix_os2_table(xml, style, flag_35=WIDTH_35_STR in variant)
+    fix_os2_table(font, style, flag_35=WIDTH_35_STR in variant)
     # post テーブルを編集
-    fix_post_table(xml, flag_35=WIDTH_35_STR in variant)
+    fix_post_table(font, flag_35=WIDTH_35_STR in variant, glyph_names=glyph_names)
     # cmap テーブルを編集
-    fix_cmap_table(xml, style, variant)
-
-    # ttxファイルを上書き保存
-    xml.write(
-        f"{BUILD_FONTS_DIR}/{output_name_base}.ttx",
-        encoding="utf-8",
-        xml_declaration=True,
-    )
-
-    # ttxファイルをttfファイルに適用
-    ttx.main(
-        [
-            "-o",
-            f"{BUILD_FONTS_DIR}/{output_name_base}_os2_post.ttf",
-            "-m",
-            f"{BUILD_FONTS_DIR}/{input_font_name}",
-            f"{BUILD_FONTS_DIR}/{output_name_base}.ttx",
-        ]
-    )
+    fix_cmap_table(font, style, variant)
 
-    # ファイル名を変更
-    os.rename(
-        f"{BUILD_FONTS_DIR}/{output_name_base}_os2_post.ttf",
-        f"{BUILD_FONTS_DIR}/{completed_name_base}.ttf",
-    )
-
-
-def dump_ttx(input_name_base, output_name_base) -> ET:
-    """OS/2, post テーブルのみのttxファイルを出力"""
-    ttx.main(
-        [
-            "-t",
-            "OS/2",
-            "-t",
-            "post",
-            "-t",
-            "cmap",
-            "-f",
-            "-o",
-            f"{BUILD_FONTS_DIR}/{output_name_base}.ttx",
-            f"{BUILD_FONTS_DIR}/{input_name_base}",
-        ]
-    )
+    font_path = f"{BUILD_FONTS_DIR}/{completed_name_base}.ttf"
+    font.save(font_path)
+    return font_path
 
-    return ET.parse(f"{BUILD_FONTS_DIR}/{output_name_base}.ttx")
 
-
-def fix_os2_table(xml: ET, style: str, flag_35: bool = False):
+def fix_os2_table(font: ttLib.TTFont, style: str, flag_35: bool = False):
     """OS/2 テーブルを編集する"""
+    os2_table = font["OS/2"]
     # xAvgCharWidthを編集
-    # タグ形式: <xAvgCharWidth value="1000"/>
     if flag_35:
         x_avg_char_width = FULL_WIDTH_35
     else:
         x_avg_char_width = HALF_WIDTH_12
-    xml.find("OS_2/xAvgCharWidth").set("value", str(x_avg_char_width))
+    os2_table.xAvgCharWidth = x_avg_char_width
 
     # fsSelectionを編集
-    # タグ形式: <fsSelection value="00000000 11000000" />
     # スタイルに応じたビットを立てる
     fs_selection = None
     if style == "Regular":
-        fs_selection = "00000001 01000000"
+        fs_selection = 0b00000001_01000000
     elif style == "Italic":
-        fs_selection = "00000001 00000001"
+        fs_selection = 0b00000001_00000001
     elif style == "Bold":
-        fs_selection = "00000001 00100000"
+        fs_selection = 0b00000001_00100000
     elif style == "BoldItalic":
-        fs_selection = "00000001 00100001"
+        fs_selection = 0b00000001_00100001
 
     if fs_selection is not None:
-        xml.find("OS_2/fsSelection").set("value", fs_selection)
+        os2_table.fsSelection = fs_selection
 
     # panoseを編集
-    # タグ形式:
-    # <panose>
-    #   <bFamilyType value="2" />
-    #   <bSerifStyle value="11" />
-    #   <bWeight value="6" />
-    #   <bProportion value="9" />
-    #   <bContrast value="6" />
-    #   <bStrokeVariation value="3" />
-    #   <bArmStyle value="0" />
-    #   <bLetterForm value="2" />
-    #   <bMidline value="0" />
-    #   <bXHeight value="4" />
-    # </panose>
     if style == "Regular" or style == "Italic":
         bWeight = 5
     else:
@@ -243,33 +480,187 @@ def fix_os2_table(xml: ET, style: str, flag_35: bool = False):
         }
 
     for key, value in panose.items():
-        xml.find(f"OS_2/panose/{key}").set("value", str(value))
+        setattr(os2_table.panose, key, value)
 
 
-def fix_post_table(xml: ET, flag_35):
-    """post テーブルを編集する"""
+def fix_post_table(font: ttLib.TTFont, flag_35, glyph_names=True):
+    """post テーブルを編集する
+    glyph_names が False の場合は、グリフ名を持たない format 3 にする"""
     # isFixedPitchを編集
-    # タグ形式: <isFixedPitch value="0"/>
     is_fixed_pitch = 0 if flag_35 else 1
-    xml.find("post/isFixedPitch").set("value", str(is_fixed_pitch))
+    font["post"].isFixedPitch = is_fixed_pitch
+    if not glyph_names:
+        font["post"].formatType = 3.0
 
 
-def fix_cmap_table(xml: ET, style: str, variant: str):
+def fix_cmap_table(font: ttLib.TTFont, style: str, variant: str):
     """異体字シーケンスを搭載するために cmap テーブルを編集する。
     pyftmerge で結合すると異体字シーケンスを司るテーブル cmap_format_14 が
     消えてしまうため、マージする前の編集済み日本語フォントから該当テーブル情報を取り出して適用する。"""
-    # タグ形式:
-    # <cmap_format_14 platformID="0" platEncID="5">
-    #   <map uv="0x4fae" uvs="0xfe00" name="uniFA30"/>
-    #   <map uv="0x50e7" uvs="0xfe00" name="uniFA31"/>
-    # </cmap_format_14>
-    source_xml = dump_ttx(
-        f"{FONTFORGE_PREFIX}{FONT_NAME}{variant}-{style}-jp.ttf",
-        f"{FONTFORGE_PREFIX}{FONT_NAME}{variant}-{style}-jp",
+    # 日本語フォントは cmap テーブルのみを読み込む
+    source_font = ttLib.TTFont(
+        f"{BUILD_FONTS_DIR}/{FONTFORGE_PREFIX}{FONT_NAME}{variant}-{style}-jp.ttf",
+        lazy=True,
+    )
+    for source_cmap_format_14 in source_font["cmap"].tables:
+        if source_cmap_format_14.format == 14:
+            source_cmap_format_14.ensureDecompiled()
+            font["cmap"].tables.append(source_cmap_format_14)
+    source_font.close()
+
+
+def get_size_report(font_path: str) -> dict:
+    """完成したフォントのサイズの内訳を返す
+    テーブルごとのサイズと、Unicode のブロックごとのグリフ数・glyf のバイト数・うちヒンティングの命令のバイト数を求める。
+    複数の符号位置から参照されるグリフは最も小さい符号位置のブロックに数え、
+    cmap から参照されないグリフ (異体字や GSUB で使うグリフ) は "(unmapped)" に数える"""
+    font = ttLib.TTFont(font_path, lazy=True)
+    tables = {tag: font.reader.tables[tag].length for tag in sorted(font.reader.keys())}
+
+    # グリフは展開せず、loca の位置で glyf のバイト列を切り出す
+    glyph_order = font.getGlyphOrder()
+    glyf_data = font.reader["glyf"]
+    loca = font["loca"]
+    block_by_glyph = {}
+    for code, glyph_name in sorted(font.getBestCmap().items()):
+        if glyph_name not in block_by_glyph:
+            block_by_glyph[glyph_name] = unicodedata.block(chr(code))
+    blocks = {}
+    for glyph_id, glyph_name in enumerate(glyph_order):
+        data = glyf_data[loca[glyph_id] : loca[glyph_id + 1]]
+        block = blocks.setdefault(
+            block_by_glyph.get(glyph_name, "(unmapped)"),
+            {"glyphs": 0, "glyf_bytes": 0, "hinting_bytes": 0},
+        )
+        block["glyphs"] += 1
+        block["glyf_bytes"] += len(data)
+        block["hinting_bytes"] += get_instruction_length(data)
+    font.close()
+
+    return {
+        "file_size": os.path.getsize(font_path),
+        "tables": tables,
+        "blocks": dict(
+            sorted(blocks.items(), key=lambda item: item[1]["glyf_bytes"], reverse=True)
+        ),
+    }
+
+
+def get_instruction_length(data: bytes) -> int:
+    """glyf テーブルの1グリフのバイト列から、ヒンティングの命令のバイト数を返す"""
+    if len(data) < 10:
+        return 0
+    number_of_contours = struct.unpack(">h", data[0:2])[0]
+    if number_of_contours >= 0:
+        # 単純グリフは輪郭の終点のリストの後に命令の長さがある
+        offset = 10 + 2 * number_of_contours
+        return struct.unpack(">H", data[offset : offset + 2])[0]
+
+    # 複合グリフはすべての参照の後に命令の長さがある (WE_HAVE_INSTRUCTIONS の場合のみ)
+    offset = 10
+    more_components = True
+    while more_components:
+        flags = struct.unpack(">H", data[offset : offset + 2])[0]
+        # flags, glyphIndex, 引数 (ARG_1_AND_2_ARE_WORDS なら2バイトずつ)
+        offset += 4 + (4 if flags & 0x0001 else 2)
+        # WE_HAVE_A_SCALE, WE_HAVE_AN_X_AND_Y_SCALE, WE_HAVE_A_TWO_BY_TWO
+        if flags & 0x0008:
+            offset += 2
+        elif flags & 0x0040:
+            offset += 4
+        elif flags & 0x0080:
+            offset += 8
+        more_components = flags & 0x0020
+    if flags & 0x0100:
+        return struct.unpack(">H", data[offset : offset + 2])[0]
+    return 0
+
+
+def print_size_report(font_path: str, size_report: dict, limit=10):
+    """フォントのサイズの内訳を、大きいものから表示する"""
+    print(f"size {font_path}: {size_report['file_size'] / 1024:.0f} KB")
+    tables = sorted(size_report["tables"].items(), key=lambda t: t[1], reverse=True)
+    print(
+        "  tables: "
+        + ", ".join(f"{tag.strip()} {length / 1024:.0f} KB" for tag, length in tables)
+    )
+    for name, block in list(size_report["blocks"].items())[:limit]:
+        print(
+            f"  {name}: {block['glyphs']} glyphs, "
+            f"glyf {block['glyf_bytes'] / 1024:.0f} KB "
+            f"(hinting {block['hinting_bytes'] / 1024:.0f} KB)"
+        )
+
+
+def get_size_budget(variant: str, options_) -> int:
+    """バリアントのフォントのサイズの上限 (KB) を返す
+    Nerd Fonts 版はグリフが多いため別の上限とする"""
+    if "size-budget" in options_:
+        return options_["size-budget"]
+    if NERD_FONTS_STR in variant:
+        return SIZE_BUDGET_NF_KB
+    return SIZE_BUDGET_KB
+
+
+def check_size_budget(font_path: str, size_report: dict, budget_kb: int):
+    """フォントのサイズが上限を超えていればエラーとする"""
+    if budget_kb <= 0:
+        return
+    size_kb = size_report["file_size"] / 1024
+    if size_kb > budget_kb:
+        raise RuntimeError(
+            f"{font_path}: {size_kb:.0f} KB exceeds the size budget {budget_kb} KB"
+        )
+
+
+def compress_woff2(font_path: str) -> str:
+    """完成したフォントを glyf, loca テーブルを変換した WOFF2 に圧縮し、WOFF2 ファイルのパスを返す"""
+    woff2_path = str(Path(font_path).with_suffix(".woff2"))
+    print(f"compress {woff2_path}")
+    woff2.compress(font_path, woff2_path, transform_tables={"glyf", "loca"})
+    verify_woff2(font_path, woff2_path)
+    return woff2_path
+
+
+def verify_woff2(font_path: str, woff2_path: str):
+    """WOFF2 ファイルを展開し、元のフォントと同じグリフのデータになることを確かめる
+    glyf テーブルは WOFF2 で再構成されるため、バイト列ではなく輪郭・命令・送り幅を比較する"""
+    font = ttLib.TTFont(font_path)
+    decompressed = BytesIO()
+    woff2.decompress(woff2_path, decompressed)
+    decompressed.seek(0)
+    woff2_font = ttLib.TTFont(decompressed)
+
+    if font.getGlyphOrder() != woff2_font.getGlyphOrder():
+        raise RuntimeError(f"{woff2_path}: glyph order differs from {font_path}")
+    for glyph_name in font.getGlyphOrder():
+        if get_glyph_data(font, glyph_name) != get_glyph_data(woff2_font, glyph_name):
+            raise RuntimeError(
+                f"{woff2_path}: glyph {glyph_name} differs from {font_path}"
+            )
+    if font["hmtx"].metrics != woff2_font["hmtx"].metrics:
+        raise RuntimeError(f"{woff2_path}: hmtx differs from {font_path}")
+    if font.getBestCmap() != woff2_font.getBestCmap():
+        raise RuntimeError(f"{woff2_path}: cmap differs from {font_path}")
+    font.close()
+    woff2_font.close()
+
+
+def get_glyph_data(font: ttLib.TTFont, glyph_name: str):
+    """グリフの比較に使う (輪郭の座標, 輪郭の終点, オンカーブ点か, 命令) を返す
+    複合グリフは参照先を展開した座標で比較する"""
+    glyf = font["glyf"]
+    glyph = glyf[glyph_name]
+    coordinates, end_points, flags = glyph.getCoordinates(glyf)
+    program = b""
+    if hasattr(glyph, "program"):
+        program = glyph.program.getBytecode()
+    return (
+        list(coordinates),
+        list(end_points),
+        [flag & 0x01 for flag in flags],
+        program,
     )
-    source_cmap_format_14 = source_xml.find("cmap/cmap_format_14")
-    target_cmap = xml.find("cmap")
-    target_cmap.append(source_cmap_format_14)
 
 
 if __name__ == "__main__":
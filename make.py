@@ -0,0 +1,373 @@
+#!/bin/env python3
+
+# fontforge_script.py と fonttools_script.py を (バリアント, スタイル) ごとのジョブとして並列実行する
+# make.ps1 のクロスプラットフォーム版
+
+import configparser
+import glob
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import build_cache
+
+# iniファイルを読み込む
+settings = configparser.ConfigParser()
+settings.read("build.ini", encoding="utf-8")
+
+VERSION = settings.get("DEFAULT", "VERSION")
+FONT_NAME = settings.get("DEFAULT", "FONT_NAME")
+BUILD_FONTS_DIR = settings.get("DEFAULT", "BUILD_FONTS_DIR")
+
+# (fontforge_script.py のオプション, fonttools_script.py に渡すバリアント名)
+# 並列処理内で、処理が重いNerd Fontsのビルドを優先して処理する
+VARIANTS = [
+    ("--nerd-font", "NF"),  # ビルド 通常版 + Nerd Fonts
+    ("--discord --nerd-font", "DiscordNF"),  # ビルド Discord + Nerd Fonts
+    ("", ""),  # ビルド 通常版
+    ("--discord", "Discord"),  # ビルド Discord
+]
+STYLES = ["Regular", "Bold"]
+
+# 日本語フォントのサブセットと処理段階の前半が共通になるバリアントのグループ
+# (Nerd Fonts の有無で決まる)。グループごとに共通の処理段階を1度だけ実行しておく
+SHARED_STAGE_OPTIONS = ["--nerd-font", ""]
+
+# リリース用フォルダへの振り分け (拡張子を除いたパターン, フォルダ名)
+# 先に一致したパターンが優先される
+RELEASE_FILES = [
+    ("BizinGothic*NF-*", f"BizinGothicNF_{VERSION}"),
+    ("BizinGothicDiscord*-*", f"BizinGothicDiscord_{VERSION}"),
+    ("BizinGothic*-*", f"BizinGothic_{VERSION}"),
+]
+RELEASE_EXTENSIONS = ["ttf", "woff2"]
+WEBFONT_DIR = f"{BUILD_FONTS_DIR}/webfont"
+
+if sys.platform == "win32":
+    DEFAULT_FONTFORGE_COMMAND = [
+        "C:\\Program Files (x86)\\FontForgeBuilds\\bin\\ffpython.exe"
+    ]
+else:
+    DEFAULT_FONTFORGE_COMMAND = ["fontforge", "-lang=py", "-script"]
+
+options = {}
+
+
+def main():
+    # オプション判定
+    get_options()
+    if options.get("unknown-option"):
+        usage()
+        sys.exit(1)
+
+    if options.get("clear-cache"):
+        # キャッシュは削除されずに増え続けるため、不要になったら削除する
+        print(f"Clear {build_cache.CACHE_DIR}")
+        build_cache.clear()
+        return
+
+    # buildディレクトリを作成する
+    if os.path.exists(BUILD_FONTS_DIR) and not options.get("do-not-delete-build-dir"):
+        shutil.rmtree(BUILD_FONTS_DIR)
+    os.makedirs(f"{BUILD_FONTS_DIR}/logs", exist_ok=True)
+
+    # Nerd Font などの共通アセットを各ジョブで重複して作らないよう、先に作成しておく
+    if not options.get("no-cache"):
+        print("Prepare assets")
+        subprocess.run(
+            get_fontforge_command() + ["fontforge_script.py", "--prepare-assets"],
+            check=True,
+        )
+        # 各ジョブが共通の処理段階を重複して行わないよう、先にチェックポイントを作成しておく
+        print("Prepare checkpoints")
+        failed_logs = prepare_checkpoints()
+        if failed_logs:
+            print(
+                f"Error: failed to prepare checkpoints (log: {', '.join(failed_logs)})"
+            )
+            sys.exit(1)
+
+    jobs = [
+        (fontforge_option, variant, style)
+        for fontforge_option, variant in VARIANTS
+        for style in STYLES
+    ]
+    results = run_jobs(jobs, options.get("jobs", os.cpu_count() or 1))
+
+    print_summary(results)
+    if any(result["status"] != "done" for result in results):
+        sys.exit(1)
+
+    if options.get("webfont"):
+        webfont_command = [sys.executable, "webfont_script.py"]
+        if "jobs" in options:
+            webfont_command.append(f"--jobs={options['jobs']}")
+        if options.get("profile"):
+            webfont_command.append("--profile")
+        subprocess.run(webfont_command, check=True)
+
+    if options.get("release"):
+        move_release_files()
+
+
+def usage():
+    print(
+        f"Usage: {sys.argv[0]} "
+        "[--jobs=N] [--fontforge=COMMAND] [--do-not-delete-build-dir] [--release] "
+        "[--no-cache] [--profile] [--no-jp-subset] [--woff2] [--webfont] "
+        "[--size-budget=KB] [--clear-cache]"
+    )
+
+
+def get_options():
+    """オプションを取得する"""
+
+    global options
+
+    for arg in sys.argv[1:]:
+        # オプション判定
+        if arg.startswith("--jobs="):
+            options["jobs"] = int(arg.split("=")[1])
+        elif arg.startswith("--fontforge="):
+            options["fontforge"] = arg.split("=", 1)[1]
+        elif arg == "--do-not-delete-build-dir":
+            options["do-not-delete-build-dir"] = True
+        elif arg == "--release":
+            options["release"] = True
+        elif arg == "--no-cache":
+            options["no-cache"] = True
+        elif arg == "--profile":
+            options["profile"] = True
+        elif arg == "--clear-cache":
+            # ビルドせずにキャッシュを削除する
+            options["clear-cache"] = True
+        elif arg == "--no-jp-subset":
+            # 日本語フォントを事前にサブセット化せず、そのまま FontForge で開く
+            options["no-jp-subset"] = True
+        elif arg == "--woff2":
+            options["woff2"] = True
+        elif arg.startswith("--size-budget="):
+            # 完成したフォントのサイズの上限 (KB)。build.ini の SIZE_BUDGET_KB より優先する
+            options["size-budget"] = int(arg.split("=")[1])
+        elif arg == "--webfont":
+            # ビルド後に Web フォント (シャード分割した WOFF2 と CSS) を生成する
+            options["webfont"] = True
+        else:
+            options["unknown-option"] = True
+            return
+
+
+def prepare_checkpoints():
+    """バリアントのグループごとに、共通の処理段階までのチェックポイントを作成する
+    失敗したグループのログのパスのリストを返す"""
+    with ThreadPoolExecutor(max_workers=len(SHARED_STAGE_OPTIONS)) as executor:
+        futures = [
+            executor.submit(prepare_checkpoint, fontforge_option)
+            for fontforge_option in SHARED_STAGE_OPTIONS
+        ]
+        failed_logs = [future.result() for future in futures]
+    return [log_path for log_path in failed_logs if log_path]
+
+
+def prepare_checkpoint(fontforge_option: str):
+    """1つのグループの全スタイルのチェックポイントを作成する。失敗した場合はログのパスを返す"""
+    group = "NF" if fontforge_option else "default"
+    log_path = f"{BUILD_FONTS_DIR}/logs/checkpoint-{group}.log"
+    jp_subset_path = f"{BUILD_FONTS_DIR}/subset_checkpoint-{group}-jp-{{style}}.ttf"
+    commands = []
+    if not options.get("no-jp-subset"):
+        commands.append(
+            [
+                sys.executable,
+                "subset_script.py",
+                *fontforge_option.split(),
+                f"--output={jp_subset_path}",
+            ]
+        )
+    commands.append(
+        get_fontforge_command()
+        + [
+            "fontforge_script.py",
+            "--do-not-delete-build-dir",
+            "--prepare-checkpoint",
+            *fontforge_option.split(),
+            *(
+                [f"--jp-source={jp_subset_path}"]
+                if not options.get("no-jp-subset")
+                else []
+            ),
+        ]
+    )
+    failed_log = None
+    with open(log_path, "w", encoding="utf-8") as log:
+        for command in commands:
+            completed = subprocess.run(
+                command, stdout=log, stderr=subprocess.STDOUT, check=False
+            )
+            if completed.returncode != 0:
+                failed_log = log_path
+                break
+    # サブセット化した日本語フォントはチェックポイントの作成後は不要
+    for path in glob.glob(jp_subset_path.replace("{style}", "*")):
+        os.remove(path)
+    return failed_log
+
+
+def run_jobs(jobs, max_workers):
+    """ジョブを並列実行する
+    ジョブの処理本体は子プロセスで動くため、スレッドはその完了を待つだけとなる。
+    各ジョブは fontforge_script.py → fonttools_script.py の順に実行するため、
+    あるジョブの fonttools の処理は他のジョブの FontForge の処理と並行して進む。"""
+    results = []
+    max_workers = max(1, min(max_workers, len(jobs)))
+    print(f"Build {len(jobs)} jobs with {max_workers} workers")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run_job, *job) for job in jobs]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(
+                f"[{result['status']}] {result['name']} "
+                f"(subset {result['subset_time']:.1f}s, "
+                f"fontforge {result['fontforge_time']:.1f}s, "
+                f"fonttools {result['fonttools_time']:.1f}s)"
+            )
+    return results
+
+
+def run_job(fontforge_option: str, variant: str, style: str):
+    """1つの (バリアント, スタイル) をビルドする"""
+    name = f"{variant}-{style}"
+    log_path = f"{BUILD_FONTS_DIR}/logs/{FONT_NAME.replace(' ', '')}{name}.log"
+    result = {
+        "name": name,
+        "status": "done",
+        "subset_time": 0.0,
+        "fontforge_time": 0.0,
+        "fonttools_time": 0.0,
+        "log": log_path,
+    }
+    print(f"[start] {name}")
+
+    fontforge_command = get_fontforge_command()
+    # 使われないグリフを除いた日本語フォント ({style} は各スクリプトで置き換える)
+    jp_subset_path = (
+        f"{BUILD_FONTS_DIR}/subset_{FONT_NAME.replace(' ', '')}{name}-jp-{{style}}.ttf"
+    )
+    commands = []
+    if not options.get("no-jp-subset"):
+        commands.append(
+            (
+                "subset",
+                [
+                    sys.executable,
+                    "subset_script.py",
+                    *fontforge_option.split(),
+                    f"--styles={style}",
+                    f"--output={jp_subset_path}",
+                    *(["--no-cache"] if options.get("no-cache") else []),
+                ],
+            )
+        )
+    commands += [
+        (
+            "fontforge",
+            fontforge_command
+            + [
+                "fontforge_script.py",
+                "--do-not-delete-build-dir",
+                *fontforge_option.split(),
+                f"--styles={style}",
+                *(
+                    [f"--jp-source={jp_subset_path}"]
+                    if not options.get("no-jp-subset")
+                    else []
+                ),
+                *(["--no-cache"] if options.get("no-cache") else []),
+                *(["--profile"] if options.get("profile") else []),
+            ],
+        ),
+        (
+            "fonttools",
+            [
+                sys.executable,
+                "fonttools_script.py",
+                name,
+                *(["--no-cache"] if options.get("no-cache") else []),
+                *(["--profile"] if options.get("profile") else []),
+                *(["--woff2"] if options.get("woff2") else []),
+                # リリース用のフォントはグリフ名を持たない post テーブルにする
+                *(["--no-glyph-names"] if options.get("release") else []),
+                *(
+                    [f"--size-budget={options['size-budget']}"]
+                    if "size-budget" in options
+                    else []
+                ),
+            ],
+        ),
+    ]
+    with open(log_path, "w", encoding="utf-8") as log:
+        for stage, command in commands:
+            start = time.perf_counter()
+            completed = subprocess.run(
+                command, stdout=log, stderr=subprocess.STDOUT, check=False
+            )
+            result[f"{stage}_time"] = time.perf_counter() - start
+            if completed.returncode != 0:
+                result["status"] = f"{stage} failed"
+                break
+    # サブセット化した日本語フォントは FontForge での処理後は不要
+    for path in glob.glob(jp_subset_path.replace("{style}", "*")):
+        os.remove(path)
+    return result
+
+
+def get_fontforge_command():
+    """FontForge の Python スクリプト実行コマンドを取得する"""
+    if "fontforge" not in options:
+        return DEFAULT_FONTFORGE_COMMAND
+    if sys.platform == "win32":
+        # Windows ではパスの区切り文字を壊さないよう非POSIXモードで分割し、引用符を外す
+        return [
+            token.strip('"') for token in shlex.split(options["fontforge"], posix=False)
+        ]
+    return shlex.split(options["fontforge"])
+
+
+def print_summary(results):
+    """ジョブごとの結果を表示する"""
+    print("=== Summary ===")
+    for result in sorted(results, key=lambda r: r["name"]):
+        line = (
+            f"{result['name']:<20} {result['status']:<18} "
+            f"subset {result['subset_time']:7.1f}s  "
+            f"fontforge {result['fontforge_time']:7.1f}s  "
+            f"fonttools {result['fonttools_time']:7.1f}s"
+        )
+        if result["status"] != "done":
+            line += f"  log: {result['log']}"
+        print(line)
+
+
+def move_release_files():
+    """ビルドしたフォントをリリース用フォルダに移動する"""
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    move_dir = f"release_files/build_{timestamp}"
+    for pattern, folder in RELEASE_FILES:
+        folder_path = f"{move_dir}/{folder}"
+        os.makedirs(folder_path, exist_ok=True)
+        for extension in RELEASE_EXTENSIONS:
+            for filename in glob.glob(f"{BUILD_FONTS_DIR}/{pattern}.{extension}"):
+                shutil.move(filename, folder_path)
+    if os.path.isdir(WEBFONT_DIR):
+        shutil.move(WEBFONT_DIR, f"{move_dir}/BizinGothicWebfont_{VERSION}")
+    print(f"Moved release files to {move_dir}")
+
+
+if __name__ == "__main__":
+    main()
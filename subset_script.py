@@ -0,0 +1,175 @@
+#!/bin/env python3
+
+# FontForge で開く前に、合成後のフォントで使われない日本語フォントのグリフを取り除く
+# 英語フォントや Nerd Fonts のグリフで置き換える符号位置を fontTools の subsetter で削除し、
+# 異体字シーケンスの字形や GSUB で参照されるグリフは残す。
+
+import configparser
+import os
+import shutil
+import sys
+import uuid
+
+import fontTools
+from fontTools import subset, ttLib
+
+import build_cache
+import codepoint_plan
+import font_index
+
+# iniファイルを読み込む
+settings = configparser.ConfigParser()
+settings.read("build.ini", encoding="utf-8")
+
+JP_FONT = settings.get("DEFAULT", "JP_FONT")
+SOURCE_FONTS_DIR = settings.get("DEFAULT", "SOURCE_FONTS_DIR")
+BUILD_FONTS_DIR = settings.get("DEFAULT", "BUILD_FONTS_DIR")
+
+# スタイル名と、合成元の (日本語フォント, 英語フォント) のスタイル名の対応
+# fontforge_script.py の STYLES と同じ
+STYLES = {
+    "Regular": ("Regular", "Medium"),
+    "Bold": ("Bold", "Bold"),
+}
+
+options = {}
+
+
+def main():
+    # オプション判定
+    get_options()
+    if options.get("unknown-option"):
+        usage()
+        sys.exit(1)
+
+    output = options.get(
+        "output", f"{BUILD_FONTS_DIR}/subset_{os.path.basename(JP_FONT)}"
+    )
+    for merged_style in options.get("styles", list(STYLES.keys())):
+        jp_style, eng_style = STYLES[merged_style]
+        output_path = output.replace("{style}", jp_style)
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        subset_jp_font(jp_style, eng_style, output_path)
+
+
+def usage():
+    print(
+        f"Usage: {sys.argv[0]} "
+        "[--nerd-font] [--discord] [--styles=Regular,Bold] [--output=PATH] "
+        "[--no-cache]"
+    )
+
+
+def get_options():
+    """オプションを取得する
+    --nerd-font, --discord は fontforge_script.py と同じ指定とする"""
+
+    global options
+
+    for arg in sys.argv[1:]:
+        # オプション判定
+        if arg == "--nerd-font":
+            options["nerd-font"] = True
+        elif arg == "--discord":
+            options["discord"] = True
+        elif arg.startswith("--styles="):
+            styles = arg.split("=")[1].split(",")
+            if not all(style in STYLES for style in styles):
+                options["unknown-option"] = True
+                return
+            options["styles"] = styles
+        elif arg.startswith("--output="):
+            # 出力先 ({style} は日本語フォントのスタイル名に置き換える)
+            options["output"] = arg.split("=", 1)[1]
+        elif arg == "--no-cache":
+            options["no-cache"] = True
+        else:
+            options["unknown-option"] = True
+            return
+
+
+def subset_jp_font(jp_style, eng_style, output_path):
+    """日本語フォントから、他のフォントのグリフで置き換える符号位置を削除する"""
+    source_path = f"{SOURCE_FONTS_DIR}/{JP_FONT.replace('{style}', jp_style)}"
+    plan = codepoint_plan.make_source_plan(jp_style, eng_style, options)
+    removed = codepoint_plan.get_jp_subset_removal(plan)
+    index = font_index.load(source_path)
+    unicodes = font_index.codepoints(index) - removed
+    # subsetter は要求された符号位置に異体字セレクタが無いと異体字シーケンスを削除するため、
+    # 異体字セレクタと、default UVS 以外の字形のグリフも要求する
+    variation_selectors = {selector for _, selector, _ in index["uvs"]}
+    uvs_gids = {gid for _, _, gid in index["uvs"] if gid is not None}
+    # 残る異体字シーケンス (置き換える符号位置の default UVS 以外)
+    num_uvs = sum(
+        1 for code, _, gid in index["uvs"] if gid is not None or code in unicodes
+    )
+
+    cache_key = None
+    if not options.get("no-cache"):
+        cache_key = build_cache.make_key(
+            build_cache.file_hash(source_path),
+            sorted(unicodes),
+            fontTools.version,
+            build_cache.source_hash(subset_jp_font),
+            build_cache.source_hash(get_subset_options),
+        )
+        cached_path = build_cache.get("jp_subset", cache_key, "jp.ttf")
+        if cached_path:
+            print(f"use jp subset cache {cache_key}")
+            shutil.copyfile(cached_path, output_path)
+            return
+
+    # 同じ入力からは同じファイルになるよう、更新日時は変えない
+    font = ttLib.TTFont(source_path, recalcTimestamp=False)
+    num_glyphs = len(font.getGlyphOrder())
+    subsetter = subset.Subsetter(get_subset_options())
+    subsetter.populate(unicodes=unicodes | variation_selectors, gids=uvs_gids)
+    subsetter.subset(font)
+    if count_uvs(font) != num_uvs:
+        raise RuntimeError(
+            f"{source_path}: variation sequences {num_uvs} -> {count_uvs(font)}"
+        )
+    print(
+        f"subset {source_path}: "
+        f"glyphs {num_glyphs} -> {len(font.getGlyphOrder())}, "
+        f"removed codepoints {len(removed)}"
+    )
+
+    tmp_path = f"{output_path}.{uuid.uuid4().hex}.tmp"
+    font.save(tmp_path)
+    if cache_key is not None:
+        build_cache.put("jp_subset", cache_key, "jp.ttf", tmp_path)
+    os.replace(tmp_path, output_path)
+
+
+def count_uvs(font: ttLib.TTFont) -> int:
+    """cmap format 14 の異体字シーケンスの数を返す"""
+    return sum(
+        len(mappings)
+        for subtable in font["cmap"].tables
+        if subtable.format == 14
+        for mappings in subtable.uvsDict.values()
+    )
+
+
+def get_subset_options():
+    """グリフの削除以外はソースフォントのまま残す subsetter のオプションを返す"""
+    subset_options = subset.Options()
+    # GSUB の全機能と、それらから参照されるグリフを残す
+    subset_options.layout_features = ["*"]
+    subset_options.layout_scripts = ["*"]
+    # テーブル・名前・グリフ名は FontForge が読み込むためそのまま残す
+    subset_options.drop_tables = []
+    subset_options.passthrough_tables = True
+    subset_options.name_IDs = ["*"]
+    subset_options.name_languages = ["*"]
+    subset_options.name_legacy = True
+    subset_options.legacy_kern = True
+    subset_options.glyph_names = True
+    subset_options.notdef_outline = True
+    subset_options.prune_unicode_ranges = False
+    return subset_options
+
+
+if __name__ == "__main__":
+    main()
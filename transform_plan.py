@@ -0,0 +1,134 @@
+#!/bin/env python3
+
+# グリフのアフィン変換を遅延して適用する
+# 同じグリフへの変換は合成して glyph.temporary に保持し、輪郭の書き換えはグリフごとに1回だけ行う。
+# fontforge_script.py (FontForge 組み込みの Python) から使う
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+# 変換後の幅を FontForge に計算させるための空のグリフ
+scratch_glyph = None
+
+
+def compose(m1, m2):
+    """m1 の後に m2 を適用する変換行列を返す (psMat.compose と同じ)"""
+    a1, b1, c1, d1, e1, f1 = m1
+    a2, b2, c2, d2, e2, f2 = m2
+    return (
+        a1 * a2 + b1 * c2,
+        a1 * b2 + b1 * d2,
+        c1 * a2 + d1 * c2,
+        c1 * b2 + d1 * d2,
+        e1 * a2 + f1 * c2 + e2,
+        e1 * b2 + f1 * d2 + f2,
+    )
+
+
+def is_axis_aligned(matrix) -> bool:
+    """回転・せん断を含まない変換か"""
+    return matrix[1] == 0 and matrix[2] == 0
+
+
+def transform_bounding_box(matrix, bb):
+    """回転・せん断を含まない変換を適用した後のバウンディングボックスを返す"""
+    a, _, _, d, e, f = matrix
+    x_min, x_max = sorted((a * bb[0] + e, a * bb[2] + e))
+    y_min, y_max = sorted((d * bb[1] + f, d * bb[3] + f))
+    return (x_min, y_min, x_max, y_max)
+
+
+def transformed_width(width, matrix):
+    """FontForge でグリフを変換したときの変換後の幅を返す"""
+    global scratch_glyph
+    if scratch_glyph is None:
+        import fontforge
+
+        scratch_glyph = fontforge.font().createChar(-1, "transform_plan_width")
+    scratch_glyph.width = width
+    scratch_glyph.transform(matrix)
+    return scratch_glyph.width
+
+
+def transform(glyph, matrix, width=None):
+    """グリフに変換を予約する
+    幅は glyph.transform と同じ値に即座に更新する。変換後に幅を設定し直す場合は width で指定できる"""
+    if width is None:
+        width = transformed_width(glyph.width, matrix)
+    if glyph.width != width:
+        glyph.width = width
+    glyph.temporary = compose(glyph.temporary or IDENTITY, tuple(matrix))
+
+
+def bounding_box(glyph):
+    """予約済みの変換を適用した後のバウンディングボックスを返す
+    回転を含む場合は解析的に求められないため、変換を適用してから求める"""
+    pending = glyph.temporary
+    if pending is None:
+        return glyph.boundingBox()
+    if not is_axis_aligned(pending):
+        flush_glyph(glyph)
+        return glyph.boundingBox()
+    bb = glyph.boundingBox()
+    # 輪郭が無いグリフは変換しても (0, 0, 0, 0) のまま
+    if bb == (0, 0, 0, 0):
+        return bb
+    return transform_bounding_box(pending, bb)
+
+
+def flush_glyph(glyph):
+    """予約済みの変換をグリフに適用する"""
+    pending = glyph.temporary
+    if pending is None:
+        return
+    glyph.temporary = None
+    if pending == IDENTITY:
+        return
+    width = glyph.width
+    glyph.transform(pending)
+    glyph.width = width
+
+
+def flush(font, only_empty=False):
+    """フォント内の予約済みの変換を適用する
+    only_empty を指定した場合は、mergeFonts などで置き換えられうる空のグリフのみを対象とする"""
+    for glyph in font.glyphs():
+        if glyph.temporary is not None and (
+            not only_empty or not glyph.isWorthOutputting()
+        ):
+            flush_glyph(glyph)
+
+
+def clear_glyph(glyph):
+    """予約済みの変換を適用してからグリフを消去する"""
+    flush_glyph(glyph)
+    glyph.clear()
+
+
+def export(font) -> dict:
+    """予約済みの変換を {エンコーディング位置: 変換行列} の形で返す"""
+    return {
+        str(glyph.encoding): list(glyph.temporary)
+        for glyph in font.glyphs()
+        if glyph.temporary is not None
+    }
+
+
+def export_by_name(font) -> dict:
+    """予約済みの変換を {グリフ名: 変換行列} の形で返す
+    生成した ttf に fonttools で変換を適用するために使う。
+    参照を含むグリフは ttf では複合グリフになり座標を直接変換できないため、ここで適用しておく"""
+    pending = {}
+    for glyph in font.glyphs():
+        if glyph.temporary is None:
+            continue
+        if glyph.references:
+            flush_glyph(glyph)
+        else:
+            pending[glyph.glyphname] = list(glyph.temporary)
+    return pending
+
+
+def restore(font, pending: dict):
+    """export した予約済みの変換をフォントに設定し直す"""
+    for encoding, matrix in pending.items():
+        font[int(encoding)].temporary = tuple(matrix)
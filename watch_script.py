@@ -0,0 +1,404 @@
+#!/bin/env python3
+
+# カスタムグリフの sfd ファイルを監視し、変更されたグリフだけを最後にビルドしたフォントに反映する
+# FontForge での合成はやり直さず、合成時にカスタムグリフへ適用される変換 (日本語フォントの縮小) を
+# fontTools で適用して glyf テーブルを書き換える。プレビュー用のため、書き換えたグリフのヒンティングは削除される。
+# リリースするフォントは make.py でビルドし直すこと。
+
+import configparser
+import glob
+import os
+import sys
+import time
+import uuid
+from decimal import Decimal
+from hashlib import sha256
+from pathlib import Path
+
+from fontTools import ttLib
+from fontTools.pens.ttGlyphPen import TTGlyphPen
+
+import codepoint_plan
+
+# iniファイルを読み込む
+settings = configparser.ConfigParser()
+settings.read("build.ini", encoding="utf-8")
+
+FONT_NAME = settings.get("DEFAULT", "FONT_NAME")
+SOURCE_FONTS_DIR = settings.get("DEFAULT", "SOURCE_FONTS_DIR")
+BUILD_FONTS_DIR = settings.get("DEFAULT", "BUILD_FONTS_DIR")
+DISCORD_STR = settings.get("DEFAULT", "DISCORD_STR")
+NERD_FONTS_STR = settings.get("DEFAULT", "NERD_FONTS_STR")
+HALF_WIDTH_12 = int(settings.get("DEFAULT", "HALF_WIDTH_12"))
+JP_SCALE = Decimal(settings.get("DEFAULT", "JP_SCALE"))
+
+# スタイル名と、合成元の (日本語フォント, 英語フォント) のスタイル名の対応
+# fontforge_script.py の STYLES と同じ
+STYLES = {
+    "Regular": ("Regular", "Medium"),
+    "Bold": ("Bold", "Bold"),
+}
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+options = {}
+
+
+def main():
+    # オプション判定
+    get_options()
+    if options.get("unknown-option"):
+        usage()
+        sys.exit(1)
+
+    watch(options.get("variant"))
+
+
+def usage():
+    print(f"Usage: {sys.argv[0]} [VARIANT-STYLE] [--interval=SECONDS] [--once]")
+
+
+def get_options():
+    """オプションを取得する"""
+
+    global options
+
+    for arg in sys.argv[1:]:
+        # オプション判定
+        if arg.startswith("--interval="):
+            # sfd ファイルの更新を確認する間隔 (秒)
+            options["interval"] = float(arg.split("=")[1])
+        elif arg == "--once":
+            # 監視せず、すべてのカスタムグリフを1回だけ反映して終了する
+            options["once"] = True
+        elif arg.startswith("--"):
+            options["unknown-option"] = True
+            return
+        elif "variant" not in options:
+            # 特定のバリエーションのみを処理するための指定 (例: NF-Regular, -Bold)
+            options["variant"] = arg
+        else:
+            options["unknown-option"] = True
+            return
+
+
+def watch(specific_variant: str):
+    """カスタムグリフの sfd ファイルを監視し、変更されたグリフをビルド済みフォントに反映する"""
+
+    if specific_variant is None:
+        specific_variant = ""
+
+    file_pattern = f"{FONT_NAME.replace(' ', '')}{specific_variant}*.ttf"
+    font_paths = [
+        Path(f) for f in sorted(glob.glob(f"{BUILD_FONTS_DIR}/{file_pattern}"))
+    ]
+    # ファイルが見つからない場合はエラー
+    if len(font_paths) == 0:
+        print(f"Error: {file_pattern} not found")
+        return
+    sfd_paths = sorted(
+        glob.glob(f"{SOURCE_FONTS_DIR}/biz-ud-gothic/custom_glyphs*.sfd")
+        + glob.glob(f"{SOURCE_FONTS_DIR}/inconsolata/custom_glyphs-*.sfd")
+    )
+
+    # 前回確認した時点の sfd ファイルの更新日時とグリフ
+    mtimes = {path: os.stat(path).st_mtime_ns for path in sfd_paths}
+    snapshots = {path: read_sfd_glyphs(path) for path in sfd_paths}
+
+    if options.get("once"):
+        patch_fonts(
+            font_paths, {path: set(glyphs) for path, glyphs in snapshots.items()}
+        )
+        return
+
+    print(f"watch {len(sfd_paths)} sfd files (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(options.get("interval", 1.0))
+            changed = {}
+            for path in sfd_paths:
+                mtime = os.stat(path).st_mtime_ns
+                if mtime == mtimes[path]:
+                    continue
+                mtimes[path] = mtime
+                glyphs = read_sfd_glyphs(path)
+                previous = snapshots[path]
+                snapshots[path] = glyphs
+                # グリフの内容 (StartChar から EndChar まで) のハッシュが変わったものだけを反映する
+                changed_codepoints = {
+                    code
+                    for code, glyph in glyphs.items()
+                    if code not in previous or previous[code]["hash"] != glyph["hash"]
+                }
+                removed_codepoints = set(previous) - set(glyphs)
+                if removed_codepoints:
+                    # 削除されたグリフは元のグリフに戻せないため、ビルドし直す必要がある
+                    print(
+                        f"{path}: removed {codepoint_plan.format_ranges(removed_codepoints)}"
+                        " (rebuild with make.py to restore them)"
+                    )
+                if changed_codepoints:
+                    changed[path] = changed_codepoints
+            if changed:
+                patch_fonts(font_paths, changed, snapshots)
+    except KeyboardInterrupt:
+        pass
+
+
+def read_sfd_glyphs(path: str) -> dict:
+    """sfd ファイルのグリフを {符号位置: {"hash", "width", "contours"}} の形で返す
+    輪郭は (x, y, オンカーブ点か, TrueType の点として出力されるか) のリストのリストとする"""
+    glyphs = {}
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    quadratic = False
+    chunk = None
+    for line in lines:
+        if line.startswith("Layer: 1 "):
+            # "Layer: <番号> <2次ベジェ曲線か> <名前> <背景か>" の形式
+            quadratic = line.split()[2] == "1"
+        elif line.startswith("StartChar: "):
+            chunk = [line]
+        elif chunk is not None:
+            chunk.append(line)
+            if line == "EndChar":
+                glyph = parse_sfd_glyph(chunk)
+                if glyph["code"] >= 0:
+                    if not quadratic:
+                        raise ValueError(f"{path}: cubic outlines are not supported")
+                    glyph["hash"] = sha256("\n".join(chunk).encode()).hexdigest()
+                    glyphs[glyph.pop("code")] = glyph
+                chunk = None
+    return glyphs
+
+
+def parse_sfd_glyph(chunk) -> dict:
+    """sfd ファイルの StartChar から EndChar までを解析する
+    輪郭の各行は "x y m|l 種類,点番号,制御点の点番号" または
+    "制御点x 制御点y 制御点x 制御点y x y c 種類,点番号,制御点の点番号" の形式で、
+    点番号が -1 の点は TrueType では出力されない (前後の制御点の中点となる)"""
+    code = -1
+    width = 0
+    contours = []
+    in_spline_set = False
+    for line in chunk:
+        if line.startswith("Encoding: "):
+            code = int(line.split()[2])
+        elif line.startswith("Width: "):
+            width = int(line.split()[1])
+        elif line.startswith("Refer: "):
+            raise ValueError(f"{chunk[0]}: references are not supported")
+        elif line == "SplineSet":
+            in_spline_set = True
+        elif line == "EndSplineSet":
+            in_spline_set = False
+        elif in_spline_set:
+            fields = line.split()
+            operator = fields[-2]
+            point_number = int(fields[-1].split(",")[1])
+            if operator == "m":
+                contours.append([])
+            elif operator == "c":
+                x1, y1, x2, y2 = map(float, fields[0:4])
+                previous = contours[-1][-1]
+                # 2次ベジェ曲線では2つの制御点は同じ位置となる。制御点が無い場合は直線となる
+                if (x1, y1) != previous[:2]:
+                    contours[-1].append((x1, y1, False, True))
+            x, y = map(float, fields[-4:-2])
+            contours[-1].append((x, y, True, point_number >= 0))
+    return {"code": code, "width": width, "contours": contours}
+
+
+def draw_glyph(contours, matrix):
+    """変換を適用した輪郭から glyf テーブルのグリフを作る
+    FontForge が ttf を出力するときと同様に、座標は最も近い整数 (0.5 は偶数側) に丸める"""
+    a, b, c, d, e, f = matrix
+    pen = TTGlyphPen(None)
+    for contour in contours:
+        points = [
+            (round(a * x + c * y + e), round(b * x + d * y + f), on_curve, output)
+            for x, y, on_curve, output in contour
+        ]
+        # 始点と同じ位置の終点は closePath で取り除かれる
+        pen.moveTo(points[0][:2])
+        off_curve_points = []
+        for x, y, on_curve, output in points[1:]:
+            if not on_curve:
+                off_curve_points.append((x, y))
+            elif not output:
+                # 出力されない点は、前後の制御点から求まる
+                continue
+            elif off_curve_points:
+                pen.qCurveTo(*off_curve_points, (x, y))
+                off_curve_points = []
+            else:
+                pen.lineTo((x, y))
+        if off_curve_points:
+            pen.qCurveTo(*off_curve_points, points[0][:2])
+        pen.closePath()
+    return pen.glyph()
+
+
+def get_shrink_matrix(width):
+    """fontforge_script.py の shrink_jp_font と同じ、縮小と中心位置への移動の変換を返す"""
+    scale = float(JP_SCALE)
+    # FontForge は変換後の幅を整数に丸める
+    scaled_width = round(width * scale)
+    return (scale, 0.0, 0.0, scale, (width - scaled_width) / 2, 0.0)
+
+
+def patch_fonts(font_paths, changed: dict, snapshots=None):
+    """変更されたカスタムグリフをビルド済みの各フォントに反映する
+    changed は {sfd ファイルのパス: 変更された符号位置の集合} とする"""
+    if snapshots is None:
+        snapshots = {path: read_sfd_glyphs(path) for path in changed}
+    plans = {}
+    for font_path in font_paths:
+        start_time = time.perf_counter()
+        variant, style = font_path.stem.replace(FONT_NAME.replace(" ", ""), "").split(
+            "-"
+        )
+        jp_style, eng_style = STYLES[style]
+        variant_options = {
+            "discord": DISCORD_STR in variant,
+            "nerd-font": NERD_FONTS_STR in variant,
+        }
+        plan_key = (jp_style, eng_style, *variant_options.values())
+        if plan_key not in plans:
+            plans[plan_key] = codepoint_plan.make_source_plan(
+                jp_style, eng_style, variant_options
+            )
+        glyphs = get_custom_glyphs(
+            jp_style, eng_style, variant_options, plans[plan_key], changed, snapshots
+        )
+        if not glyphs:
+            continue
+        patched = patch_font(font_path, glyphs)
+        if not patched:
+            print(f"unchanged {str(font_path)}")
+            continue
+        print(
+            f"patch {str(font_path)}: {codepoint_plan.format_ranges(patched)} "
+            f"({time.perf_counter() - start_time:.2f}s)"
+        )
+
+
+def get_custom_glyphs(
+    jp_style, eng_style, variant_options, plan, changed, snapshots
+) -> dict:
+    """フォントに反映するカスタムグリフを {符号位置: (グリフ, 変換行列)} の形で返す"""
+    eng_path = f"{SOURCE_FONTS_DIR}/inconsolata/custom_glyphs-{eng_style}.sfd"
+    jp_path = f"{SOURCE_FONTS_DIR}/biz-ud-gothic/custom_glyphs-{jp_style}.sfd"
+    discord_path = (
+        f"{SOURCE_FONTS_DIR}/biz-ud-gothic/custom_glyphs_discord-{jp_style}.sfd"
+    )
+    # 後に合成される sfd ファイルのグリフが優先される
+    # ビルドでは合成前にグリフを削除した符号位置のみが sfd ファイルのグリフになる
+    sources = [
+        (eng_path, "eng", codepoint_plan.ENG_CUSTOM_GLYPHS),
+        (jp_path, "jp", codepoint_plan.JP_CUSTOM_GLYPHS),
+    ]
+    if variant_options["discord"]:
+        sources.append((discord_path, "jp", codepoint_plan.DISCORD_CUSTOM_GLYPHS))
+
+    glyphs = {}
+    for path, owner, merged_codepoints in sources:
+        merged_codepoints = set(merged_codepoints)
+        for code in changed.get(path, set()) & merged_codepoints:
+            glyphs.pop(code, None)
+            if code not in plan["owner"][owner]:
+                # 他のフォントのグリフで置き換えられている
+                continue
+            if owner == "eng":
+                # 英語フォントのカスタムグリフは合成後に変換されない
+                glyphs[code] = (snapshots[path][code], IDENTITY)
+                continue
+            glyph = snapshots[path][code]
+            if (
+                variant_options["nerd-font"]
+                and glyph["width"] == HALF_WIDTH_12 * 2
+                and code in get_east_asian_ambiguous_width_codepoints()
+            ):
+                print(
+                    f"U+{code:04X}: East Asian Ambiguous Width glyphs are not patched "
+                    "(rebuild with make.py)"
+                )
+                continue
+            glyphs[code] = (glyph, get_shrink_matrix(glyph["width"]))
+        # 後から合成される sfd ファイルにあるグリフは、前の sfd ファイルの変更では変わらない
+        for code in snapshots.get(path, {}).keys() & merged_codepoints:
+            if path not in changed or code not in changed[path]:
+                glyphs.pop(code, None)
+    return glyphs
+
+
+def get_east_asian_ambiguous_width_codepoints() -> set:
+    """Nerd Fonts 版で半角幅に調整する符号位置を返す"""
+    return codepoint_plan.expand_ranges(
+        codepoint_plan.EAW_SHRINK
+        + codepoint_plan.EAW_MOVE
+        + codepoint_plan.EAW_WIDTH_ONLY
+        + codepoint_plan.EAW_SHRINK_TALL
+    )
+
+
+def patch_font(font_path: Path, glyphs: dict) -> set:
+    """ビルド済みフォントのグリフを書き換え、書き換えた符号位置を返す
+    輪郭と送り幅がビルド済みのグリフと同じものは書き換えない (ヒンティングも残る)"""
+    # 全グリフのバウンディングボックスを計算し直すと遅いため、書き換えたグリフの分だけ更新する
+    font = ttLib.TTFont(str(font_path), recalcBBoxes=False)
+    cmap = font.getBestCmap()
+    glyf = font["glyf"]
+    hmtx = font["hmtx"]
+    head = font["head"]
+    maxp = font["maxp"]
+    patched = set()
+    for code, (glyph, matrix) in glyphs.items():
+        glyph_name = cmap.get(code)
+        if glyph_name is None:
+            continue
+        new_glyph = draw_glyph(glyph["contours"], matrix)
+        new_glyph.recalcBounds(glyf)
+        if is_same_glyph(font, glyph_name, new_glyph, glyph["width"]):
+            continue
+        patched.add(code)
+        glyf[glyph_name] = new_glyph
+        if new_glyph.numberOfContours == 0:
+            hmtx[glyph_name] = (glyph["width"], 0)
+            continue
+        hmtx[glyph_name] = (glyph["width"], new_glyph.xMin)
+        head.xMin = min(head.xMin, new_glyph.xMin)
+        head.yMin = min(head.yMin, new_glyph.yMin)
+        head.xMax = max(head.xMax, new_glyph.xMax)
+        head.yMax = max(head.yMax, new_glyph.yMax)
+        maxp.maxPoints = max(maxp.maxPoints, len(new_glyph.coordinates))
+        maxp.maxContours = max(maxp.maxContours, new_glyph.numberOfContours)
+
+    if not patched:
+        font.close()
+        return patched
+
+    # 書き込み中のフォントをビューアが読み込まないよう、一時ファイルから置き換える
+    tmp_path = f"{font_path}.{uuid.uuid4().hex}.tmp"
+    font.save(tmp_path)
+    font.close()
+    os.replace(tmp_path, font_path)
+    return patched
+
+
+def is_same_glyph(font: ttLib.TTFont, glyph_name: str, new_glyph, width) -> bool:
+    """ビルド済みのグリフと輪郭・送り幅が同じかを返す (ヒンティングの命令は比較しない)"""
+    glyf = font["glyf"]
+    if font["hmtx"][glyph_name][0] != width:
+        return False
+    coordinates, end_points, flags = glyf[glyph_name].getCoordinates(glyf)
+    new_coordinates, new_end_points, new_flags = new_glyph.getCoordinates(glyf)
+    return (
+        list(coordinates) == list(new_coordinates)
+        and list(end_points) == list(new_end_points)
+        and [flag & 0x01 for flag in flags] == [flag & 0x01 for flag in new_flags]
+    )
+
+
+if __name__ == "__main__":
+    main()
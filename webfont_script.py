@@ -0,0 +1,271 @@
+#!/bin/env python3
+
+# 完成したフォントを Unicode の範囲ごとの WOFF2 (シャード) に分割し、@font-face の CSS を生成する
+# ブラウザは unicode-range によってページで使われている文字を含むシャードのみを読み込む。
+
+import configparser
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+from fontTools import subset, ttLib
+
+import build_report
+import codepoint_plan
+
+# iniファイルを読み込む
+settings = configparser.ConfigParser()
+settings.read("build.ini", encoding="utf-8")
+
+FONT_NAME = settings.get("DEFAULT", "FONT_NAME")
+BUILD_FONTS_DIR = settings.get("DEFAULT", "BUILD_FONTS_DIR")
+WEBFONT_DIR = f"{BUILD_FONTS_DIR}/webfont"
+
+# シャード名と、そのシャードに含める範囲
+# 漢字は JIS 第1水準 (常用の漢字を概ね含む)、第2水準、それ以外の順に分ける (get_shard_name を参照)
+SHARD_NAMES = ["latin", "symbols", "kana", "kanji-1", "kanji-2", "kanji-3", "nerd"]
+LATIN_RANGES = [
+    (0x0000, 0x024F),  # Basic Latin..Latin Extended-B
+    (0x2000, 0x206F),  # General Punctuation
+    (0x20A0, 0x20CF),  # Currency Symbols
+]
+KANA_RANGES = [
+    (0x3000, 0x303F),  # CJK Symbols and Punctuation
+    (0x3040, 0x309F),  # Hiragana
+    (0x30A0, 0x30FF),  # Katakana
+    (0x31F0, 0x31FF),  # Katakana Phonetic Extensions
+    (0xFF00, 0xFFEF),  # Halfwidth and Fullwidth Forms
+]
+KANJI_RANGES = [
+    (0x3400, 0x4DBF),  # CJK Unified Ideographs Extension A
+    (0x4E00, 0x9FFF),  # CJK Unified Ideographs
+    (0xF900, 0xFAFF),  # CJK Compatibility Ideographs
+    (0x20000, 0x3FFFF),  # Supplementary / Tertiary Ideographic Plane
+]
+NERD_RANGES = [
+    (0xE000, 0xF8FF),  # Private Use Area
+    (0xF0000, 0xFFFFD),  # Supplementary Private Use Area-A
+]
+# 異体字セレクタ (異体字シーケンスを含むシャードの unicode-range に加える)
+VARIATION_SELECTOR_RANGES = [
+    (0xFE00, 0xFE0F),  # Variation Selectors
+    (0xE0100, 0xE01EF),  # Variation Selectors Supplement
+]
+
+options = {}
+
+
+def main():
+    # オプション判定
+    get_options()
+    if options.get("unknown-option"):
+        usage()
+        sys.exit(1)
+
+    build_webfonts(options.get("variant"))
+
+
+def usage():
+    print(f"Usage: {sys.argv[0]} [VARIANT-STYLE] [--jobs=N] [--profile]")
+
+
+def get_options():
+    """オプションを取得する"""
+
+    global options
+
+    for arg in sys.argv[1:]:
+        # オプション判定
+        if arg.startswith("--jobs="):
+            # フォントを並列に分割するプロセス数
+            options["jobs"] = int(arg.split("=")[1])
+        elif arg == "--profile":
+            # 処理段階ごとに cProfile の結果を出力する
+            options["profile"] = True
+        elif arg.startswith("--"):
+            options["unknown-option"] = True
+            return
+        elif "variant" not in options:
+            # 特定のバリエーションのみを処理するための指定 (例: NF-Regular, -Bold)
+            options["variant"] = arg
+        else:
+            options["unknown-option"] = True
+            return
+
+
+def build_webfonts(specific_variant: str):
+    """完成したフォントをシャードに分割し、バリアントごとの CSS を出力する"""
+
+    if specific_variant is None:
+        specific_variant = ""
+
+    file_pattern = f"{FONT_NAME.replace(' ', '')}{specific_variant}*.ttf"
+    filenames = sorted(glob.glob(f"{BUILD_FONTS_DIR}/{file_pattern}"))
+    # ファイルが見つからない場合はエラー
+    if len(filenames) == 0:
+        print(f"Error: {file_pattern} not found")
+        return
+    paths = [Path(f) for f in filenames]
+    os.makedirs(WEBFONT_DIR, exist_ok=True)
+
+    # フォントごとに別プロセスで分割する
+    jobs = min(options.get("jobs", os.cpu_count() or 1), len(paths))
+    if jobs <= 1:
+        results = [build_webfont(path, options) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(build_webfont, path, options) for path in paths]
+            results = [future.result() for future in futures]
+
+    # 同じバリアントのスタイルを1つの CSS にまとめる
+    rules_by_variant = {}
+    for variant, rules in results:
+        rules_by_variant.setdefault(variant, []).extend(rules)
+    for variant, rules in rules_by_variant.items():
+        css_path = f"{WEBFONT_DIR}/{FONT_NAME.replace(' ', '')}{variant}.css"
+        with open(css_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(rules))
+        print(f"write {css_path}")
+
+
+def build_webfont(path: Path, options_):
+    """1つのフォントをシャードに分割し、(バリアント, @font-face のリスト) を返す
+    ワーカープロセスからも呼ばれるため、オプションは引数で受け取る"""
+    print(f"split {str(path)}")
+    variant, style = path.stem.replace(FONT_NAME.replace(" ", ""), "").split("-")
+
+    report = build_report.BuildReport(
+        "webfont", path.stem, profile=options_.get("profile")
+    )
+    with report.stage("read_font"):
+        font_data = path.read_bytes()
+        font = ttLib.TTFont(BytesIO(font_data))
+        family_name = font["name"].getDebugName(1)
+        weight = font["OS/2"].usWeightClass
+        codepoints_by_shard = {}
+        for code in font.getBestCmap():
+            codepoints_by_shard.setdefault(get_shard_name(code), set()).add(code)
+        variation_sequences = get_variation_sequences(font)
+        font.close()
+
+    rules = []
+    with report.stage("subset_shards"):
+        for shard_name in SHARD_NAMES:
+            codepoints = codepoints_by_shard.get(shard_name)
+            if not codepoints:
+                continue
+            unicode_ranges = list(codepoint_plan.to_ranges(codepoints))
+            shard_sequences = {
+                sequence
+                for sequence in variation_sequences
+                if sequence[0] in codepoints
+            }
+            # 異体字シーケンスを含むシャードは、異体字セレクタも同じシャードで表示させる
+            if shard_sequences:
+                unicode_ranges += VARIATION_SELECTOR_RANGES
+            shard_path = f"{WEBFONT_DIR}/{path.stem}.{shard_name}.woff2"
+            subset_shard(font_data, codepoints, shard_sequences, shard_path)
+            rules.append(
+                get_font_face_rule(
+                    family_name,
+                    weight,
+                    os.path.basename(shard_path),
+                    unicode_ranges,
+                )
+            )
+    report.save()
+    return variant, rules
+
+
+def get_shard_name(code: int) -> str:
+    """符号位置を含めるシャード名を返す"""
+    if in_ranges(code, NERD_RANGES):
+        return "nerd"
+    if in_ranges(code, KANJI_RANGES):
+        return f"kanji-{get_jis_level(code)}"
+    if in_ranges(code, KANA_RANGES):
+        return "kana"
+    if in_ranges(code, LATIN_RANGES):
+        return "latin"
+    return "symbols"
+
+
+def in_ranges(code: int, ranges) -> bool:
+    """符号位置が (開始, 終了) の範囲のいずれかに含まれるか"""
+    return any(start <= code <= end for start, end in ranges)
+
+
+def get_jis_level(code: int) -> int:
+    """漢字の JIS 水準を返す。JIS X 0208 に含まれない漢字は 3 とする
+    EUC-JP の1バイト目が 0xB0-0xCF なら第1水準、0xD0-0xF4 なら第2水準となる"""
+    try:
+        encoded = chr(code).encode("euc_jp")
+    except UnicodeEncodeError:
+        return 3
+    if len(encoded) != 2:
+        return 3
+    if 0xB0 <= encoded[0] <= 0xCF:
+        return 1
+    if 0xD0 <= encoded[0] <= 0xF4:
+        return 2
+    return 3
+
+
+def get_variation_sequences(font: ttLib.TTFont) -> set:
+    """cmap format 14 の異体字シーケンスを (基底文字, 異体字セレクタ) の集合で返す"""
+    return {
+        (code, variation_selector)
+        for table in font["cmap"].tables
+        if table.format == 14
+        for variation_selector, mappings in table.uvsDict.items()
+        for code, _ in mappings
+    }
+
+
+def subset_shard(font_data: bytes, codepoints: set, sequences: set, shard_path: str):
+    """シャードに含める符号位置のみを残した WOFF2 を出力する
+    異体字シーケンス (cmap format 14) と GSUB で参照されるグリフも残す"""
+    font = ttLib.TTFont(BytesIO(font_data))
+    subset_options = subset.Options()
+    subset_options.layout_features = ["*"]
+    subset_options.name_IDs = ["*"]
+    subset_options.name_languages = ["*"]
+    subset_options.notdef_outline = True
+    subsetter = subset.Subsetter(subset_options)
+    # subsetter は要求された符号位置に異体字セレクタが無いと異体字シーケンスを削除する
+    variation_selectors = {variation_selector for _, variation_selector in sequences}
+    subsetter.populate(unicodes=codepoints | variation_selectors)
+    subsetter.subset(font)
+    subset_sequences = get_variation_sequences(font)
+    if subset_sequences != sequences:
+        raise RuntimeError(
+            f"{shard_path}: variation sequences "
+            f"{len(sequences)} -> {len(subset_sequences)}"
+        )
+    font.flavor = "woff2"
+    font.save(shard_path)
+    font.close()
+
+
+def get_font_face_rule(family_name, weight, filename, unicode_ranges) -> str:
+    """シャードの @font-face を返す"""
+    unicode_range = ", ".join(
+        f"U+{start:X}" if start == end else f"U+{start:X}-{end:X}"
+        for start, end in unicode_ranges
+    )
+    return f"""@font-face {{
+  font-family: "{family_name}";
+  font-style: normal;
+  font-weight: {weight};
+  font-display: swap;
+  src: url("{filename}") format("woff2");
+  unicode-range: {unicode_range};
+}}
+"""
+
+
+if __name__ == "__main__":
+    main()